@@ -0,0 +1,207 @@
+"""Admission control for the classification endpoints.
+
+Two layers protect the inference path from overload:
+- per-client token buckets reject floods with 429 before any work is queued
+- a global in-flight cap admits requests per priority class, and sheds them
+  with 503 once the expected queueing delay exceeds the latency budget
+
+Interactive requests (single-text moderation) may use every inference slot,
+while bulk requests (file uploads) are limited to a smaller share and always
+yield to waiting interactive requests.
+"""
+import functools
+import math
+import os
+import threading
+import time
+
+from flask import current_app, jsonify, request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", "5"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "10"))
+BULK_RATE_LIMIT_RPS = float(os.getenv("BULK_RATE_LIMIT_RPS", "0.2"))
+BULK_RATE_LIMIT_BURST = float(os.getenv("BULK_RATE_LIMIT_BURST", "2"))
+MAX_INFLIGHT = int(os.getenv("MAX_INFLIGHT", "4"))
+BULK_MAX_INFLIGHT = int(os.getenv("BULK_MAX_INFLIGHT", "1"))
+LATENCY_BUDGET = float(os.getenv("LATENCY_BUDGET", "2.0"))
+BULK_LATENCY_BUDGET = float(os.getenv("BULK_LATENCY_BUDGET", "30.0"))
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate` tokens per second"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, cost=1.0):
+        """Take tokens; return 0 on success or the seconds until enough refill"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Per-client, per-priority token buckets"""
+
+    def __init__(self, limits, max_clients=10000):
+        self.limits = limits
+        self.max_clients = max_clients
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.rejected = {priority: 0 for priority in limits}
+
+    def allow(self, client_id, priority):
+        """Return (allowed, retry_after_seconds); a rate of 0 disables limiting"""
+        if self.limits[priority][0] <= 0:
+            return True, 0.0
+        with self._lock:
+            key = (client_id, priority)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_clients:
+                    self._prune()
+                bucket = self._buckets[key] = TokenBucket(*self.limits[priority])
+            retry_after = bucket.take()
+            if retry_after:
+                self.rejected[priority] += 1
+                return False, retry_after
+            return True, 0.0
+
+    def _prune(self):
+        # Drop buckets that have fully refilled; they carry no state worth keeping
+        now = time.monotonic()
+        for key, bucket in list(self._buckets.items()):
+            if bucket.tokens + (now - bucket.updated) * bucket.rate >= bucket.burst:
+                del self._buckets[key]
+
+
+class AdmissionController:
+    """Global cap on in-flight inference work with latency-budget load shedding"""
+
+    def __init__(self, max_inflight, bulk_max_inflight, latency_budgets):
+        self.capacity = {INTERACTIVE: max_inflight, BULK: min(bulk_max_inflight, max_inflight)}
+        self.latency_budgets = latency_budgets
+        self._cond = threading.Condition()
+        self.inflight = {INTERACTIVE: 0, BULK: 0}
+        self.waiting = {INTERACTIVE: 0, BULK: 0}
+        # Exponentially weighted average service time per class, in seconds
+        self.service_time = {INTERACTIVE: 0.1, BULK: 5.0}
+        self.admitted = {INTERACTIVE: 0, BULK: 0}
+        self.shed = {INTERACTIVE: 0, BULK: 0}
+
+    def _has_slot(self, priority):
+        total = self.inflight[INTERACTIVE] + self.inflight[BULK]
+        if total >= self.capacity[INTERACTIVE]:
+            return False
+        if priority == BULK:
+            return self.inflight[BULK] < self.capacity[BULK] and not self.waiting[INTERACTIVE]
+        return True
+
+    def _estimated_wait(self, priority):
+        queued = self.waiting[priority] + 1
+        return queued * self.service_time[priority] / max(self.capacity[priority], 1)
+
+    def acquire(self, priority):
+        """Wait for an inference slot; return (admitted, retry_after_seconds)"""
+        budget = self.latency_budgets[priority]
+        with self._cond:
+            if not self._has_slot(priority):
+                estimated = self._estimated_wait(priority)
+                if estimated > budget:
+                    self.shed[priority] += 1
+                    return False, estimated
+                deadline = time.monotonic() + budget
+                self.waiting[priority] += 1
+                try:
+                    while not self._has_slot(priority):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.shed[priority] += 1
+                            return False, self._estimated_wait(priority)
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting[priority] -= 1
+            self.inflight[priority] += 1
+            self.admitted[priority] += 1
+            return True, 0.0
+
+    def release(self, priority, elapsed):
+        with self._cond:
+            self.inflight[priority] -= 1
+            self.service_time[priority] = 0.8 * self.service_time[priority] + 0.2 * elapsed
+            self._cond.notify_all()
+
+    def get_stats(self):
+        with self._cond:
+            return {
+                priority: {
+                    'capacity': self.capacity[priority],
+                    'inflight': self.inflight[priority],
+                    'waiting': self.waiting[priority],
+                    'admitted': self.admitted[priority],
+                    'shed': self.shed[priority],
+                    'avg_service_time': self.service_time[priority],
+                    'latency_budget': self.latency_budgets[priority]
+                }
+                for priority in (INTERACTIVE, BULK)
+            }
+
+
+rate_limiter = RateLimiter({
+    INTERACTIVE: (RATE_LIMIT_RPS, RATE_LIMIT_BURST),
+    BULK: (BULK_RATE_LIMIT_RPS, BULK_RATE_LIMIT_BURST)
+})
+admission = AdmissionController(MAX_INFLIGHT, BULK_MAX_INFLIGHT, {
+    INTERACTIVE: LATENCY_BUDGET,
+    BULK: BULK_LATENCY_BUDGET
+})
+
+
+def overload_response(message, status, retry_after):
+    response = jsonify({"error": message, "retry_after": math.ceil(retry_after)})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def admission_controlled(priority):
+    """Decorator applying rate limiting and admission control to a route"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            # Reject oversized bodies before they use a rate-limit token or a slot
+            max_length = current_app.config.get('MAX_CONTENT_LENGTH')
+            if max_length and request.content_length and request.content_length > max_length:
+                raise RequestEntityTooLarge()
+            client_id = request.remote_addr
+            allowed, retry_after = rate_limiter.allow(client_id, priority)
+            if not allowed:
+                return overload_response("Rate limit exceeded", 429, retry_after)
+            admitted, retry_after = admission.acquire(priority)
+            if not admitted:
+                return overload_response("Server is overloaded, please retry later", 503, retry_after)
+            start = time.perf_counter()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                admission.release(priority, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def get_admission_stats():
+    stats = admission.get_stats()
+    for priority, rejected in rate_limiter.rejected.items():
+        stats[priority]['rate_limited'] = rejected
+    return stats
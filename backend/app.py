@@ -1,5 +1,6 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
 from transformers import pipeline
 from datetime import datetime
 import pymongo
@@ -8,12 +9,27 @@ from dotenv import load_dotenv
 import re
 import json
 import time
+import threading
 import emoji
 
 load_dotenv()
 
+# Local modules read their settings from the environment at import time
+from cascade import load_cascade
+from model_registry import ModelRegistry, load_registry_config
+from distill import is_student_artifact, load_student
+from shadow import ShadowEvaluator, SHADOW_MODEL
+from retention import HistoryCompactor, ensure_ttl_index, retention_enabled, HISTORY_RETENTION_DAYS
+from inference_runtime import build_inference_executor, InferenceQueueFull
+from profiling import span, sample_profile, install as install_profiling, PROFILING_ENABLED, PROFILER_MAX_SECONDS
+from admission import admission_controlled, get_admission_stats, overload_response, INTERACTIVE, BULK
+
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['Retry-After'])
+# Reject oversized uploads up front (Flask answers with 413)
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv("MAX_UPLOAD_BYTES", str(5 * 1024 * 1024)))
+# Per-request stage tracing and slow-request sampling (no-op unless PROFILING_ENABLED)
+install_profiling(app)
 
 # MongoDB connection - with fallback to local storage if MongoDB fails
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
@@ -52,66 +68,108 @@ def try_mongodb_connection(max_retries=3, retry_delay=2):
 try_mongodb_connection()
 
 # Local storage functions (fallback when MongoDB is unavailable)
+# Serializes access to the JSON files between request threads and compaction
+local_storage_lock = threading.Lock()
+
 def save_to_local_storage(data, collection_name):
     """Save data to local JSON file if MongoDB is unavailable"""
     file_path = f"data/{collection_name}.json"
-    # Load existing data
-    existing_data = []
-    if os.path.exists(file_path):
-        try:
-            with open(file_path, 'r') as f:
-                existing_data = json.load(f)
-        except:
-            existing_data = []
-    # Add new data
-    existing_data.append(data)
-    # Save data
-    with open(file_path, 'w') as f:
-        json.dump(existing_data, f, default=str)
+    with local_storage_lock:
+        # Load existing data
+        existing_data = []
+        if os.path.exists(file_path):
+            try:
+                with open(file_path, 'r') as f:
+                    existing_data = json.load(f)
+            except:
+                existing_data = []
+        # Add new data
+        existing_data.append(data)
+        # Save data
+        with open(file_path, 'w') as f:
+            json.dump(existing_data, f, default=str)
 
 def get_from_local_storage(collection_name):
     """Get data from local JSON file if MongoDB is unavailable"""
     file_path = f"data/{collection_name}.json"
-    if os.path.exists(file_path):
-        try:
-            with open(file_path, 'r') as f:
-                return json.load(f)
-        except:
-            return []
-    return []
+    with local_storage_lock:
+        if os.path.exists(file_path):
+            try:
+                with open(file_path, 'r') as f:
+                    return json.load(f)
+            except:
+                return []
+        return []
 
 def clear_local_storage(collection_name):
     """Clear local JSON file if MongoDB is unavailable"""
     file_path = f"data/{collection_name}.json"
-    if os.path.exists(file_path):
+    with local_storage_lock:
+        if os.path.exists(file_path):
+            try:
+                with open(file_path, 'w') as f:
+                    json.dump([], f)
+                return True
+            except:
+                return False
+        return False
+
+# History retention: TTL index in MongoDB, background compaction for local files
+history_compactor = HistoryCompactor("data", local_storage_lock)
+if retention_enabled():
+    if not use_local_storage and HISTORY_RETENTION_DAYS > 0:
         try:
-            with open(file_path, 'w') as f:
-                json.dump([], f)
-            return True
-        except:
-            return False
-    return False
+            ensure_ttl_index(db, history_collection)
+        except Exception as e:
+            print(f"Error creating history TTL index: {e}")
+    history_compactor.start()
 
-# Initialize the classifier
-try:
-    classifier = pipeline("text-classification", model="unitary/toxic-bert")
-    print("BERT model loaded successfully!")
-except Exception as e:
-    print(f"Error loading BERT model: {e}")
-    # Fallback to a simple classifier based on keyword matching
-    class SimpleClassifier:
-        def __call__(self, text):
-            toxic_words = ["hate", "kill", "die", "idiot", "stupid", "dumb"]
-            text_lower = text.lower()
-            # Check if text contains toxic words
-            has_toxic = any(word in text_lower for word in toxic_words)
-            if has_toxic:
-                return [{"label": "toxic", "score": 0.9}]
-            else:
-                return [{"label": "neutral", "score": 0.9}]
-    classifier = SimpleClassifier()
+# Fallback to a simple classifier based on keyword matching
+class SimpleClassifier:
+    def __call__(self, text):
+        if isinstance(text, list):
+            return [self(item)[0] for item in text]
+        toxic_words = ["hate", "kill", "die", "idiot", "stupid", "dumb"]
+        text_lower = text.lower()
+        # Check if text contains toxic words
+        has_toxic = any(word in text_lower for word in toxic_words)
+        if has_toxic:
+            return [{"label": "toxic", "score": 0.9}]
+        else:
+            return [{"label": "neutral", "score": 0.9}]
+
+def load_text_classifier(path):
+    """Load a text-classification pipeline from a model name or local directory"""
+    if is_student_artifact(path):
+        # Distilled student produced by distill.py; loads without torch or network
+        return load_student(path)
+    return pipeline("text-classification", model=path)
+
+# Initialize the model registry and load the active classifier
+model_registry = ModelRegistry(load_text_classifier)
+registry_models, active_model_id = load_registry_config()
+for registry_model_id, registry_model_path in registry_models.items():
+    model_registry.register(registry_model_id, registry_model_path)
+if active_model_id in registry_models:
+    model_registry.activate(active_model_id, background=False)
+if model_registry.active_id:
+    print(f"BERT model {model_registry.active_id} loaded successfully!")
+else:
+    print(f"Error loading BERT model {active_model_id}")
+    model_registry.register("keyword-fallback", None, model=SimpleClassifier())
+    model_registry.activate("keyword-fallback", background=False)
     print("Using fallback simple classifier")
 
+# Dedicated, bounded inference workers with tuned torch thread settings
+with model_registry.use() as (_, startup_model):
+    inference_executor = build_inference_executor(startup_model)
+
+# Optional lexicon + linear pre-filter that skips BERT on high-certainty texts
+CASCADE_ENABLED = os.getenv("CASCADE_ENABLED", "false").lower() == "true"
+cascade_filter = load_cascade() if CASCADE_ENABLED else None
+if cascade_filter:
+    print(f"Cascade pre-filter enabled (band {cascade_filter.low}-{cascade_filter.high})")
+
 # Expanded toxic words list including common negative emojis
 TOXIC_WORDS = [
     # Original toxic words
@@ -285,7 +343,67 @@ def detect_toxic_emoji(text):
             toxic_emojis.append(char)
     return toxic_emojis
 
+def find_toxic_words(text):
+    """Find toxic words in the text (including emojis)"""
+    toxic_words = []
+    for word in TOXIC_WORDS:
+        if word in emoji.EMOJI_DATA:  # If it's an emoji
+            if word in text:
+                toxic_words.append(word)
+        else:  # If it's a regular word
+            if re.search(r'\b' + re.escape(word) + r'\b', text.lower()):
+                toxic_words.append(word)
+    # Add detected toxic emojis to toxic words list
+    for emoji_char in detect_toxic_emoji(text):
+        if emoji_char not in toxic_words:
+            toxic_words.append(emoji_char)
+    return toxic_words
+
+def determine_classification(confidence, toxic_words):
+    """Map a model score and lexicon matches to a classification label"""
+    if confidence > 0.7 or toxic_words:
+        return 'toxic'
+    elif confidence > 0.4:
+        return 'offensive'
+    return 'neutral'
+
+# Optional shadow scoring of sampled requests by a candidate model
+shadow_evaluator = None
+if SHADOW_MODEL:
+    if SHADOW_MODEL in model_registry.entries:
+        model_registry.pin(SHADOW_MODEL)
+        model_registry.load_async(SHADOW_MODEL)
+        shadow_evaluator = ShadowEvaluator(model_registry, SHADOW_MODEL, determine_classification)
+        print(f"Shadow evaluation enabled for candidate model {SHADOW_MODEL}")
+    else:
+        print(f"Shadow model {SHADOW_MODEL} is not registered; shadow evaluation disabled")
+
+def classify_content(text, cascade=None):
+    """Classify text, resolving obvious cases in the cascade before BERT"""
+    with span('lexicon'):
+        toxic_words = find_toxic_words(text)
+    with span('cascade'):
+        decision = cascade.decide(text, toxic_words) if cascade else None
+    if decision:
+        classification, confidence, stage = decision
+        model_id = model_registry.active_id
+    else:
+        with span('model'), model_registry.use() as (model_id, model):
+            result = inference_executor.classify(model, text)[0]
+        confidence = result['score']
+        stage = 'bert'
+        classification = determine_classification(confidence, toxic_words)
+    return {
+        'classification': classification,
+        'confidence': confidence,
+        'toxic_words': toxic_words,
+        'has_emoji': contains_emoji(text),
+        'stage': stage,
+        'model_id': model_id
+    }
+
 @app.route('/api/content/classify', methods=['POST'])
+@admission_controlled(INTERACTIVE)
 def classify_text():
     global use_local_storage
     try:
@@ -294,36 +412,20 @@ def classify_text():
         if not text:
             return jsonify({"error": "No text provided"}), 400
         # Perform classification
-        result = classifier(text)[0]
-        confidence = result['score']
-        # Find toxic words in the text (including emojis)
-        toxic_words = []
-        for word in TOXIC_WORDS:
-            if word in emoji.EMOJI_DATA:  # If it's an emoji
-                if word in text:
-                    toxic_words.append(word)
-            else:  # If it's a regular word
-                if re.search(r'\b' + re.escape(word) + r'\b', text.lower()):
-                    toxic_words.append(word)
-        # Check for emojis in general
-        has_emoji = contains_emoji(text)
-        toxic_emojis = detect_toxic_emoji(text)
-        # Add detected toxic emojis to toxic words list
-        for emoji_char in toxic_emojis:
-            if emoji_char not in toxic_words:
-                toxic_words.append(emoji_char)
-        # Determine classification
-        classification = 'neutral'
-        if confidence > 0.7 or toxic_words:
-            classification = 'toxic'
-        elif confidence > 0.4:
-            classification = 'offensive'
-        # Get positive suggestion if message is toxic or offensive
-        positive_suggestion = get_positive_suggestion(classification)
-        # Generate direct positive alternative for toxic messages (keep emojis for direct text analysis)
-        direct_positive_alternative = None
-        if classification in ['toxic', 'offensive']:
-            direct_positive_alternative = generate_direct_positive_alternative(text, toxic_words, remove_emoji=False)
+        classify_start = time.perf_counter()
+        outcome = classify_content(text, cascade=cascade_filter)
+        primary_ms = (time.perf_counter() - classify_start) * 1000
+        classification = outcome['classification']
+        confidence = outcome['confidence']
+        toxic_words = outcome['toxic_words']
+        has_emoji = outcome['has_emoji']
+        with span('suggestion'):
+            # Get positive suggestion if message is toxic or offensive
+            positive_suggestion = get_positive_suggestion(classification)
+            # Generate direct positive alternative for toxic messages (keep emojis for direct text analysis)
+            direct_positive_alternative = None
+            if classification in ['toxic', 'offensive']:
+                direct_positive_alternative = generate_direct_positive_alternative(text, toxic_words, remove_emoji=False)
         # Create response
         response = {
             'text': text,
@@ -332,7 +434,9 @@ def classify_text():
             'toxic_words': toxic_words,
             'has_emoji': has_emoji,
             'positive_suggestion': positive_suggestion,
-            'direct_positive_alternative': direct_positive_alternative
+            'direct_positive_alternative': direct_positive_alternative,
+            'stage': outcome['stage'],
+            'model_id': outcome['model_id']
         }
         # Store in history
         history_entry = {
@@ -340,10 +444,11 @@ def classify_text():
             'timestamp': datetime.utcnow()
         }
         try:
-            if use_local_storage:
-                save_to_local_storage(history_entry, "history")
-            else:
-                history_collection.insert_one(history_entry)
+            with span('storage'):
+                if use_local_storage:
+                    save_to_local_storage(history_entry, "history")
+                else:
+                    history_collection.insert_one(history_entry)
         except Exception as storage_error:
             print(f"Error storing classification history entry: {storage_error}")
             # If MongoDB failed, switch to local storage
@@ -355,12 +460,21 @@ def classify_text():
                     save_to_local_storage(history_entry, "history")
                 except Exception as local_error:
                     print(f"Error saving to local storage: {local_error}")
+        # Sample for shadow scoring; the candidate runs in a background executor
+        if shadow_evaluator:
+            shadow_evaluator.submit(text, outcome, primary_ms)
         return jsonify(response)
+    except InferenceQueueFull:
+        return overload_response("Server is overloaded, please retry later", 503, inference_executor.queue_timeout)
+    except HTTPException:
+        # Let Flask answer e.g. 413 for oversized uploads instead of a 500
+        raise
     except Exception as e:
         print(f"Error in classification: {e}")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/content/classify-file', methods=['POST'])
+@admission_controlled(BULK)
 def classify_file():
     global use_local_storage
     try:
@@ -386,37 +500,19 @@ def classify_file():
                 # Update progress
                 file_processing_progress['processed'] = i + 1
                 # Classify each line
-                result = classifier(line)[0]
-                confidence = result['score']
-                # Find toxic words in the text (including emojis)
-                toxic_words = []
-                for word in TOXIC_WORDS:
-                    if word in emoji.EMOJI_DATA:  # If it's an emoji
-                        if word in line:
-                            toxic_words.append(word)
-                    else:  # If it's a regular word
-                        if re.search(r'\b' + re.escape(word) + r'\b', line.lower()):
-                            toxic_words.append(word)
-                # Check for emojis
-                has_emoji = contains_emoji(line)
-                toxic_emojis = detect_toxic_emoji(line)
-                # Add detected toxic emojis to toxic words list
-                for emoji_char in toxic_emojis:
-                    if emoji_char not in toxic_words:
-                        toxic_words.append(emoji_char)
-                # Determine classification
-                classification = 'neutral'
-                if confidence > 0.7 or toxic_words:
-                    classification = 'toxic'
-                elif confidence > 0.4:
-                    classification = 'offensive'
-                # Get positive suggestion
-                positive_suggestion = get_positive_suggestion(classification)
-                # Generate direct positive alternative for toxic messages
-                # For file upload, remove emojis from the suggestions as requested
-                direct_positive_alternative = None
-                if classification in ['toxic', 'offensive']:
-                    direct_positive_alternative = generate_direct_positive_alternative(line, toxic_words, remove_emoji=True)
+                outcome = classify_content(line, cascade=cascade_filter)
+                classification = outcome['classification']
+                confidence = outcome['confidence']
+                toxic_words = outcome['toxic_words']
+                has_emoji = outcome['has_emoji']
+                with span('suggestion'):
+                    # Get positive suggestion
+                    positive_suggestion = get_positive_suggestion(classification)
+                    # Generate direct positive alternative for toxic messages
+                    # For file upload, remove emojis from the suggestions as requested
+                    direct_positive_alternative = None
+                    if classification in ['toxic', 'offensive']:
+                        direct_positive_alternative = generate_direct_positive_alternative(line, toxic_words, remove_emoji=True)
                 # Add to results
                 results.append({
                     'text': line,
@@ -425,7 +521,9 @@ def classify_file():
                     'toxic_words': toxic_words,
                     'has_emoji': has_emoji,
                     'positive_suggestion': positive_suggestion,
-                    'direct_positive_alternative': direct_positive_alternative
+                    'direct_positive_alternative': direct_positive_alternative,
+                    'stage': outcome['stage'],
+                    'model_id': outcome['model_id']
                 })
                 # Store in history
                 history_entry = {
@@ -436,14 +534,17 @@ def classify_file():
                     'has_emoji': has_emoji,
                     'positive_suggestion': positive_suggestion,
                     'direct_positive_alternative': direct_positive_alternative,
+                    'stage': outcome['stage'],
+                    'model_id': outcome['model_id'],
                     'timestamp': datetime.utcnow(),
                     'source': 'file'
                 }
                 try:
-                    if use_local_storage:
-                        save_to_local_storage(history_entry, "history")
-                    else:
-                        history_collection.insert_one(history_entry)
+                    with span('storage'):
+                        if use_local_storage:
+                            save_to_local_storage(history_entry, "history")
+                        else:
+                            history_collection.insert_one(history_entry)
                 except Exception as storage_error:
                     print(f"Error storing history entry: {storage_error}")
                     # If MongoDB failed, switch to local storage
@@ -465,6 +566,13 @@ def classify_file():
                 'total': len(results)
             })
         return jsonify({"error": "Invalid file type. Only .txt and .csv files are allowed"}), 400
+    except InferenceQueueFull:
+        file_processing_progress['in_progress'] = False
+        file_processing_progress['error'] = "Server is overloaded"
+        return overload_response("Server is overloaded, please retry later", 503, inference_executor.queue_timeout)
+    except HTTPException:
+        # Let Flask answer e.g. 413 for oversized uploads instead of a 500
+        raise
     except Exception as e:
         print(f"Error in file classification: {e}")
         # Mark processing as failed
@@ -578,6 +686,94 @@ def clear_history():
         print(f"Error clearing history: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/content/cascade-stats', methods=['GET'])
+def get_cascade_stats():
+    if not cascade_filter:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **cascade_filter.get_stats()})
+
+@app.route('/api/models', methods=['GET'])
+def list_models():
+    return jsonify(model_registry.describe())
+
+@app.route('/api/models/activate', methods=['POST'])
+def activate_model():
+    try:
+        data = request.json or {}
+        model_id = data.get('model_id')
+        if not model_id:
+            return jsonify({"error": "No model_id provided"}), 400
+        # Only ids configured in models.json can be activated: paths are never
+        # taken from requests, since loading a model unpickles its weights.
+        # Load and warm up in the background; the swap happens once it is ready
+        model_registry.activate(model_id)
+        return jsonify({"message": f"Loading model {model_id}", **model_registry.describe()}), 202
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error activating model: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/models/rollback', methods=['POST'])
+def rollback_model():
+    try:
+        target_id = model_registry.previous_id
+        model_registry.rollback()
+        return jsonify({"message": f"Rolling back to {target_id}", **model_registry.describe()}), 202
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error rolling back model: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/shadow/stats', methods=['GET'])
+def shadow_stats():
+    if not shadow_evaluator:
+        return jsonify({"enabled": False})
+    return jsonify(shadow_evaluator.get_stats())
+
+@app.route('/api/inference/stats', methods=['GET'])
+def inference_stats():
+    return jsonify({**inference_executor.get_stats(), "tuned": inference_executor.tuned})
+
+@app.route('/api/content/admission-stats', methods=['GET'])
+def admission_stats():
+    return jsonify(get_admission_stats())
+
+@app.route('/api/content/retention', methods=['GET'])
+def retention_stats():
+    return jsonify({"enabled": retention_enabled(), **history_compactor.get_stats()})
+
+@app.route('/api/content/compact-history', methods=['POST'])
+def compact_history():
+    try:
+        report = history_compactor.run_once()
+        return jsonify({"message": "History compaction finished", **report})
+    except Exception as e:
+        print(f"Error compacting history: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/profile', methods=['POST'])
+def run_profiler():
+    # Sampling exposes every thread's stack; only available when profiling is opted into
+    if not PROFILING_ENABLED:
+        return jsonify({"error": "Profiling is disabled"}), 404
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval', 0.005))
+        if seconds <= 0 or interval <= 0:
+            return jsonify({"error": "seconds and interval must be positive"}), 400
+        profile = sample_profile(min(seconds, PROFILER_MAX_SECONDS), interval=interval)
+        if profile is None:
+            return jsonify({"error": "A profiling session is already running"}), 409
+        # Folded stacks, readable by flamegraph.pl and speedscope
+        return Response(profile, mimetype='text/plain')
+    except ValueError:
+        return jsonify({"error": "seconds and interval must be numbers"}), 400
+    except Exception as e:
+        print(f"Error running profiler: {e}")
+        return jsonify({"error": str(e)}), 500
+
 # Simple route to test if the server is running
 @app.route('/', methods=['GET'])
 def index():
@@ -585,10 +781,17 @@ def index():
         "status": "running",
         "message": "Content moderation API is running",
         "storage_mode": "local file" if use_local_storage else "MongoDB",
+        "active_model": model_registry.active_id,
         "endpoints": [
             "/api/content/classify",
             "/api/content/history",
-            "/api/content/clear-history"
+            "/api/content/clear-history",
+            "/api/content/cascade-stats",
+            "/api/content/admission-stats",
+            "/api/models",
+            "/api/shadow/stats",
+            "/api/content/retention",
+            "/api/inference/stats"
         ]
     })
 
@@ -0,0 +1,244 @@
+"""Cheap first-stage filter that resolves obvious texts before BERT.
+
+The cascade combines the lexicon/emoji matches computed by the backend with a
+small logistic model over hashed word n-grams. Texts the linear model is
+confident about are decided immediately; only the uncertain band is sent on
+to the BERT classifier.
+
+Usage:
+    python cascade.py train      # fit the linear model from history + feedback
+    python cascade.py evaluate   # compare cascade vs. BERT-only on test CSVs
+"""
+import glob
+import json
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from dotenv import load_dotenv
+
+# Also run as a command, so load backend/.env before reading settings
+load_dotenv()
+
+CASCADE_MODEL_PATH = os.getenv("CASCADE_MODEL_PATH", "models/cascade_linear.npz")
+CASCADE_LOW = float(os.getenv("CASCADE_LOW", "0.05"))
+CASCADE_HIGH = float(os.getenv("CASCADE_HIGH", "0.95"))
+HASH_DIM = 2 ** 18
+
+# Target score used for feedback corrections (hard labels)
+FEEDBACK_TARGETS = {'toxic': 1.0, 'offensive': 0.55, 'neutral': 0.0}
+# Corrections are rarer and more trustworthy, so each counts several times
+FEEDBACK_WEIGHT = 3
+
+TOKEN_PATTERN = re.compile(r"[\w']+|[^\w\s]", re.UNICODE)
+
+
+def extract_features(text):
+    """Return sorted hashed indices of unigrams and bigrams in the text"""
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    grams = tokens + [a + " " + b for a, b in zip(tokens, tokens[1:])]
+    indices = {zlib.crc32(gram.encode('utf-8')) % HASH_DIM for gram in grams}
+    return np.fromiter(sorted(indices), dtype=np.int64)
+
+
+class HashedLinearModel:
+    """Logistic regression over hashed n-gram presence features"""
+
+    def __init__(self, weights=None, bias=0.0):
+        self.weights = weights if weights is not None else np.zeros(HASH_DIM, dtype=np.float32)
+        self.bias = float(bias)
+
+    def predict(self, text):
+        """Return the estimated toxicity score in [0, 1]"""
+        indices = extract_features(text)
+        z = self.bias + float(self.weights[indices].sum())
+        return float(1.0 / (1.0 + np.exp(-z)))
+
+    def fit(self, samples, epochs=8, learning_rate=0.2, l2=1e-4):
+        """Fit on (text, target) pairs with SGD on the logistic loss.
+
+        Targets may be soft (BERT confidence) or hard (feedback corrections).
+        """
+        featurized = [(extract_features(text), target) for text, target in samples]
+        rng = np.random.default_rng(0)
+        for _ in range(epochs):
+            for i in rng.permutation(len(featurized)):
+                indices, target = featurized[i]
+                z = self.bias + float(self.weights[indices].sum())
+                gradient = 1.0 / (1.0 + np.exp(-z)) - target
+                self.weights[indices] -= learning_rate * (gradient + l2 * self.weights[indices])
+                self.bias -= learning_rate * gradient
+        return self
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez_compressed(path, weights=self.weights, bias=np.array([self.bias]))
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(weights=data['weights'].astype(np.float32), bias=float(data['bias'][0]))
+
+
+class CascadeFilter:
+    """First stage of the classification cascade.
+
+    `decide` returns a (classification, confidence, stage) tuple when the text
+    can be resolved without BERT, or None when it must go to the full model.
+    """
+
+    def __init__(self, model, low=CASCADE_LOW, high=CASCADE_HIGH):
+        self.model = model
+        self.low = low
+        self.high = high
+        self._lock = threading.Lock()
+        self.stats = {'lexicon': 0, 'linear': 0, 'bert': 0}
+
+    def decide(self, text, toxic_words):
+        score = self.model.predict(text)
+        if toxic_words:
+            # The classification rule already forces 'toxic' on any lexicon hit;
+            # report the linear model's score rather than inventing one
+            self._count('lexicon')
+            return 'toxic', score, 'lexicon'
+        if score <= self.low:
+            self._count('linear')
+            return 'neutral', score, 'linear'
+        if score >= self.high:
+            self._count('linear')
+            return 'toxic', score, 'linear'
+        self._count('bert')
+        return None
+
+    def _count(self, stage):
+        with self._lock:
+            self.stats[stage] += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        total = sum(stats.values())
+        stats['total'] = total
+        stats['bert_skip_rate'] = (total - stats['bert']) / total if total else 0.0
+        stats['band'] = [self.low, self.high]
+        return stats
+
+
+def load_cascade(path=CASCADE_MODEL_PATH, low=CASCADE_LOW, high=CASCADE_HIGH):
+    """Load the cascade filter, or return None if no trained model exists"""
+    if not os.path.exists(path):
+        print(f"Cascade model not found at {path}; run `python cascade.py train` first")
+        return None
+    try:
+        return CascadeFilter(HashedLinearModel.load(path), low=low, high=high)
+    except Exception as e:
+        print(f"Error loading cascade model: {e}")
+        return None
+
+
+def collect_training_samples(history_entries, feedback_entries):
+    """Build (text, target) pairs from stored history and feedback corrections"""
+    samples = []
+    for entry in history_entries:
+        # Cascade-decided rows carry the linear model's own score; training on
+        # them would fit the model to its own predictions
+        if entry.get('stage', 'bert') != 'bert':
+            continue
+        text = entry.get('text')
+        confidence = entry.get('confidence')
+        if text and isinstance(confidence, (int, float)):
+            samples.append((text, float(confidence)))
+    for entry in feedback_entries:
+        text = entry.get('original_text')
+        target = FEEDBACK_TARGETS.get(entry.get('correct_classification'))
+        if text and target is not None:
+            samples.extend([(text, target)] * FEEDBACK_WEIGHT)
+    return samples
+
+
+def load_training_entries():
+    """Return (history_entries, feedback_entries) from the backend's storage"""
+    import app
+    if app.use_local_storage:
+        return app.get_from_local_storage("history"), app.get_from_local_storage("feedback")
+    return (list(app.history_collection.find({}, {'_id': 0})),
+            list(app.feedback_collection.find({}, {'_id': 0})))
+
+
+def train(path=CASCADE_MODEL_PATH):
+    history_entries, feedback_entries = load_training_entries()
+    samples = collect_training_samples(history_entries, feedback_entries)
+    if not samples:
+        print("No history or feedback to train on")
+        return None
+    model = HashedLinearModel().fit(samples)
+    model.save(path)
+    print(f"Trained cascade model on {len(samples)} samples, saved to {path}")
+    return model
+
+
+def load_test_sentences(pattern=os.path.join("..", "test_data*.csv")):
+    import csv
+    sentences = {}
+    for csv_path in sorted(glob.glob(pattern)):
+        with open(csv_path, newline='', encoding='utf-8') as f:
+            rows = [row['Sentence'].strip() for row in csv.DictReader(f) if row.get('Sentence')]
+        sentences[os.path.basename(csv_path)] = rows
+    return sentences
+
+
+def evaluate(path=CASCADE_MODEL_PATH):
+    """Report throughput gain and agreement of the cascade vs. BERT-only.
+
+    The test CSVs carry no gold labels, so the BERT-only classification is
+    used as the reference and disagreement is reported as accuracy loss.
+    """
+    import app
+    cascade = load_cascade(path)
+    if cascade is None:
+        return None
+    report = {}
+    totals = {'texts': 0, 'agree': 0, 'bert_time': 0.0, 'cascade_time': 0.0}
+    for name, sentences in load_test_sentences().items():
+        start = time.perf_counter()
+        reference = [app.classify_content(text, cascade=None)['classification'] for text in sentences]
+        bert_time = time.perf_counter() - start
+        start = time.perf_counter()
+        predicted = [app.classify_content(text, cascade=cascade)['classification'] for text in sentences]
+        cascade_time = time.perf_counter() - start
+        agree = sum(1 for a, b in zip(reference, predicted) if a == b)
+        report[name] = {
+            'texts': len(sentences),
+            'agreement': agree / len(sentences) if sentences else 1.0,
+            'speedup': bert_time / cascade_time if cascade_time else None
+        }
+        totals['texts'] += len(sentences)
+        totals['agree'] += agree
+        totals['bert_time'] += bert_time
+        totals['cascade_time'] += cascade_time
+    report['overall'] = {
+        'texts': totals['texts'],
+        'bert_texts_per_sec': totals['texts'] / totals['bert_time'] if totals['bert_time'] else None,
+        'cascade_texts_per_sec': totals['texts'] / totals['cascade_time'] if totals['cascade_time'] else None,
+        'speedup': totals['bert_time'] / totals['cascade_time'] if totals['cascade_time'] else None,
+        'accuracy_loss': 1 - totals['agree'] / totals['texts'] if totals['texts'] else 0.0,
+        'stages': cascade.get_stats()
+    }
+    print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'evaluate'
+    if command == 'train':
+        train()
+    elif command == 'evaluate':
+        evaluate()
+    else:
+        print(f"Unknown command: {command}. Use 'train' or 'evaluate'.")
+        sys.exit(1)
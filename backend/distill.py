@@ -0,0 +1,142 @@
+"""Distill the toxic-bert teacher into a lightweight CPU student model.
+
+The student is a logistic model over hashed word n-grams (the same model the
+cascade pre-filter uses). It is trained on stored history texts, re-scored by
+the teacher to get soft labels, plus `feedback` corrections as hard labels.
+Training and serving run on CPU only and need no network access.
+
+The artifact is a directory with `student.json` (metadata and evaluation
+report) and `student.npz` (weights). Register the directory in models.json to
+serve it, or use it as the shadow candidate:
+    {"models": {"toxic-bert": "unitary/toxic-bert", "student": "models/student"},
+     "active": "student"}
+
+Usage:
+    python distill.py [output_dir]
+"""
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+# cascade loads backend/.env, so settings below see it when run as a command
+from cascade import HashedLinearModel, FEEDBACK_TARGETS, FEEDBACK_WEIGHT, load_training_entries
+
+STUDENT_CONFIG = "student.json"
+STUDENT_WEIGHTS = "student.npz"
+DISTILL_OUTPUT_DIR = os.getenv("DISTILL_OUTPUT_DIR", "models/student")
+DISTILL_TEACHER = os.getenv("DISTILL_TEACHER", "toxic-bert")
+DISTILL_HOLDOUT = float(os.getenv("DISTILL_HOLDOUT", "0.2"))
+DISTILL_EPOCHS = int(os.getenv("DISTILL_EPOCHS", "12"))
+
+
+class StudentClassifier:
+    """Serves a distilled student with the same call interface as the pipeline"""
+
+    def __init__(self, model, label='toxic'):
+        self.model = model
+        self.label = label
+
+    def __call__(self, text):
+        if isinstance(text, list):
+            return [self(item)[0] for item in text]
+        return [{"label": self.label, "score": self.model.predict(text)}]
+
+
+def is_student_artifact(path):
+    return bool(path) and os.path.isfile(os.path.join(path, STUDENT_CONFIG))
+
+
+def load_student(path):
+    """Load a student artifact directory written by `distill`"""
+    with open(os.path.join(path, STUDENT_CONFIG), 'r') as f:
+        config = json.load(f)
+    model = HashedLinearModel.load(os.path.join(path, config.get('weights', STUDENT_WEIGHTS)))
+    return StudentClassifier(model, label=config.get('label', 'toxic'))
+
+
+def teacher_labels(teacher, texts):
+    """Score texts with the teacher; return soft labels and seconds per text"""
+    start = time.perf_counter()
+    scores = [teacher(text)[0]['score'] for text in texts]
+    elapsed = time.perf_counter() - start
+    return scores, elapsed / len(texts) if texts else 0.0
+
+
+def evaluate_student(student, holdout, teacher_scores, teacher_seconds, rule, find_toxic_words):
+    """Compare student and teacher on held-out texts"""
+    start = time.perf_counter()
+    student_scores = [student(text)[0]['score'] for text in holdout]
+    student_seconds = (time.perf_counter() - start) / len(holdout) if holdout else 0.0
+    agree = 0
+    for text, teacher_score, student_score in zip(holdout, teacher_scores, student_scores):
+        toxic_words = find_toxic_words(text)
+        agree += rule(teacher_score, toxic_words) == rule(student_score, toxic_words)
+    return {
+        'holdout_texts': len(holdout),
+        'label_agreement': agree / len(holdout) if holdout else None,
+        'mean_abs_score_delta': (sum(abs(t - s) for t, s in zip(teacher_scores, student_scores)) / len(holdout)
+                                 if holdout else None),
+        'teacher_ms_per_text': teacher_seconds * 1000,
+        'student_ms_per_text': student_seconds * 1000,
+        'speedup': teacher_seconds / student_seconds if student_seconds else None
+    }
+
+
+def distill(output_dir=DISTILL_OUTPUT_DIR, teacher_id=DISTILL_TEACHER):
+    import app
+    history_entries, feedback_entries = load_training_entries()
+    texts = sorted({entry['text'] for entry in history_entries if entry.get('text')})
+    if not texts:
+        print("No history to distill from")
+        return None
+    random.Random(0).shuffle(texts)
+    split = int(len(texts) * (1 - DISTILL_HOLDOUT))
+    train_texts, holdout = texts[:split], texts[split:]
+    if not train_texts:
+        print(f"Not enough history to distill from ({len(texts)} texts, all held out)")
+        return None
+
+    if teacher_id not in app.model_registry.entries:
+        print(f"Teacher model {teacher_id} is not registered in models.json")
+        return None
+    if not app.model_registry.load(teacher_id):
+        print(f"Could not load teacher model {teacher_id}")
+        return None
+    with app.model_registry.use(teacher_id) as (_, teacher):
+        train_scores, _ = teacher_labels(teacher, train_texts)
+        holdout_scores, teacher_seconds = teacher_labels(teacher, holdout)
+
+    samples = list(zip(train_texts, train_scores))
+    # Corrections for held-out texts would leak into the evaluation
+    held_out = set(holdout)
+    for entry in feedback_entries:
+        target = FEEDBACK_TARGETS.get(entry.get('correct_classification'))
+        if entry.get('original_text') and entry['original_text'] not in held_out and target is not None:
+            samples.extend([(entry['original_text'], target)] * FEEDBACK_WEIGHT)
+    print(f"Training student on {len(samples)} samples ({len(train_texts)} teacher-labelled texts)")
+    student = StudentClassifier(HashedLinearModel().fit(samples, epochs=DISTILL_EPOCHS))
+
+    report = evaluate_student(student, holdout, holdout_scores, teacher_seconds,
+                              app.determine_classification, app.find_toxic_words)
+    os.makedirs(output_dir, exist_ok=True)
+    student.model.save(os.path.join(output_dir, STUDENT_WEIGHTS))
+    with open(os.path.join(output_dir, STUDENT_CONFIG), 'w') as f:
+        json.dump({
+            'type': 'hashed-linear',
+            'weights': STUDENT_WEIGHTS,
+            'label': 'toxic',
+            'teacher': teacher_id,
+            'training_samples': len(samples),
+            'created': datetime.utcnow().isoformat(),
+            'report': report
+        }, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"Student model saved to {output_dir}")
+    return report
+
+
+if __name__ == '__main__':
+    distill(sys.argv[1] if len(sys.argv) > 1 else DISTILL_OUTPUT_DIR)
@@ -0,0 +1,225 @@
+"""CPU inference runtime: torch thread settings, core pinning and a bounded executor.
+
+Flask serves each request on its own thread. If every request calls the model
+directly and torch also fans out across all cores per call, the threads
+oversubscribe the CPU and throughput collapses. Instead, all primary inference
+runs on a small pool of dedicated workers:
+- torch intra/inter-op thread counts are set once at startup
+- each worker can be pinned to its own slice of cores (Linux only)
+- workers micro-batch whatever requests are queued, up to a batch size
+- the queue is bounded; callers wait at most `queue_timeout` for a slot
+
+At startup the auto-tuner can benchmark thread/batch combinations on a short
+synthetic workload and keep the one with the best throughput.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+TORCH_INTRA_OP_THREADS = int(os.getenv("TORCH_INTRA_OP_THREADS", "0"))
+TORCH_INTER_OP_THREADS = int(os.getenv("TORCH_INTER_OP_THREADS", "1"))
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+INFERENCE_BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_SIZE", "8"))
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "64"))
+INFERENCE_QUEUE_TIMEOUT = float(os.getenv("INFERENCE_QUEUE_TIMEOUT", "5"))
+INFERENCE_PIN_CORES = os.getenv("INFERENCE_PIN_CORES", "false").lower() == "true"
+INFERENCE_AUTOTUNE = os.getenv("INFERENCE_AUTOTUNE", "false").lower() == "true"
+
+BENCHMARK_TEXTS = [
+    "Hello, how are you doing today?",
+    "You are such an idiot, nobody wants you here.",
+    "Thanks for the help with the project, it turned out great! 👍",
+    "I disagree with your point, but I respect your perspective.",
+    "This is the worst idea I have ever heard, seriously.",
+    "The weather forecast looks great for the weekend!",
+    "What you just said is pathetic and useless. 💩",
+    "Can we reschedule the meeting to Thursday afternoon?"
+]
+
+
+def available_cores():
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        # sched_getaffinity is Linux only
+        return list(range(os.cpu_count() or 1))
+
+
+def configure_torch_threads(intra_op=TORCH_INTRA_OP_THREADS, inter_op=TORCH_INTER_OP_THREADS):
+    """Set torch thread counts; 0 keeps torch's default for that setting"""
+    try:
+        import torch
+    except ImportError:
+        return
+    if intra_op > 0:
+        torch.set_num_threads(intra_op)
+    if inter_op > 0:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError:
+            # Can only be set once, before any inter-op parallel work has started
+            pass
+
+
+class InferenceQueueFull(RuntimeError):
+    """Raised when no queue slot frees up within the queue timeout"""
+
+
+class InferenceExecutor:
+    """Bounded pool of inference workers that micro-batch queued requests"""
+
+    def __init__(self, workers, batch_size=INFERENCE_BATCH_SIZE, queue_size=INFERENCE_QUEUE_SIZE,
+                 queue_timeout=INFERENCE_QUEUE_TIMEOUT, pin_cores=INFERENCE_PIN_CORES):
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.queue_timeout = queue_timeout
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'batches': 0, 'rejected': 0}
+        # Result of the startup auto-tuner, if it ran
+        self.tuned = None
+        cores = available_cores()
+        per_worker = max(1, len(cores) // self.workers)
+        self._threads = []
+        for i in range(self.workers):
+            worker_cores = cores[i * per_worker:(i + 1) * per_worker] if pin_cores else None
+            thread = threading.Thread(target=self._run, args=(worker_cores,), daemon=True,
+                                      name=f"inference-{i}")
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, model, text):
+        """Queue one text for `model`; return a Future of the model's result list"""
+        future = Future()
+        try:
+            self._queue.put((model, text, future), timeout=self.queue_timeout)
+        except queue.Full:
+            with self._lock:
+                self.stats['rejected'] += 1
+            raise InferenceQueueFull("Inference queue is full")
+        return future
+
+    def classify(self, model, text):
+        """Run `model(text)` on an inference worker and wait for the result"""
+        return self.submit(model, text).result()
+
+    def _run(self, cores):
+        if cores:
+            try:
+                # Pins the calling thread; torch threads it spawns inherit the mask
+                os.sched_setaffinity(0, cores)
+            except (AttributeError, OSError) as e:
+                print(f"Could not pin inference worker to cores {cores}: {e}")
+        while not self._stopped.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            items = [first]
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._process(items)
+
+    def _process(self, items):
+        # Requests may hold different models during a hot-swap; batch per model
+        groups = {}
+        for model, text, future in items:
+            groups.setdefault(id(model), (model, []))[1].append((text, future))
+        for model, requests in groups.values():
+            texts = [text for text, _ in requests]
+            try:
+                results = model(texts) if len(texts) > 1 else [model(texts[0])[0]]
+                for (_, future), result in zip(requests, results):
+                    future.set_result([result])
+            except Exception as e:
+                if len(requests) == 1:
+                    requests[0][1].set_exception(e)
+                else:
+                    # One bad input (e.g. too many tokens) must not fail the
+                    # unrelated requests batched with it; retry each on its own
+                    self._process_individually(model, requests)
+            with self._lock:
+                self.stats['requests'] += len(texts)
+                self.stats['batches'] += 1
+
+    def _process_individually(self, model, requests):
+        for text, future in requests:
+            try:
+                future.set_result([model(text)[0]])
+            except Exception as e:
+                future.set_exception(e)
+
+    def shutdown(self):
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join(timeout=2)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats['workers'] = self.workers
+        stats['batch_size'] = self.batch_size
+        stats['queued'] = self._queue.qsize()
+        stats['avg_batch'] = stats['requests'] / stats['batches'] if stats['batches'] else 0.0
+        return stats
+
+
+def benchmark(model, workers, batch_size, intra_op, rounds=4, concurrency=8):
+    """Return texts/second for one configuration under concurrent callers"""
+    configure_torch_threads(intra_op=intra_op, inter_op=0)
+    executor = InferenceExecutor(workers, batch_size=batch_size, pin_cores=INFERENCE_PIN_CORES)
+    texts = BENCHMARK_TEXTS * rounds
+    try:
+        executor.classify(model, texts[0])
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as callers:
+            list(callers.map(lambda text: executor.classify(model, text), texts))
+        return len(texts) / (time.perf_counter() - start)
+    finally:
+        executor.shutdown()
+
+
+def autotune(model):
+    """Pick the (intra_op threads, workers, batch size) with the best throughput"""
+    cores = len(available_cores())
+    thread_options = sorted({1, 2, 4, cores} & set(range(1, cores + 1)))
+    results = []
+    for intra_op in thread_options:
+        workers = max(1, cores // intra_op)
+        for batch_size in (1, 4, 8):
+            throughput = benchmark(model, workers, batch_size, intra_op)
+            results.append((throughput, intra_op, workers, batch_size))
+            print(f"Autotune: {intra_op} threads x {workers} workers, batch {batch_size}: "
+                  f"{throughput:.1f} texts/s")
+    throughput, intra_op, workers, batch_size = max(results)
+    print(f"Autotune selected {intra_op} threads x {workers} workers, batch {batch_size} "
+          f"({throughput:.1f} texts/s)")
+    return {'intra_op': intra_op, 'workers': workers, 'batch_size': batch_size, 'throughput': throughput}
+
+
+def build_inference_executor(model=None):
+    """Configure torch and create the executor, auto-tuning on `model` if enabled"""
+    # Inter-op threads can only be set before any parallel work starts
+    configure_torch_threads(intra_op=0)
+    cores = len(available_cores())
+    intra_op = TORCH_INTRA_OP_THREADS or 1
+    workers = INFERENCE_WORKERS or max(1, cores // intra_op)
+    batch_size = INFERENCE_BATCH_SIZE
+    tuned = None
+    if INFERENCE_AUTOTUNE and model is not None:
+        try:
+            tuned = autotune(model)
+            intra_op, workers, batch_size = tuned['intra_op'], tuned['workers'], tuned['batch_size']
+        except Exception as e:
+            print(f"Error auto-tuning inference runtime: {e}")
+    configure_torch_threads(intra_op=intra_op, inter_op=0)
+    executor = InferenceExecutor(workers, batch_size=batch_size)
+    executor.tuned = tuned
+    print(f"Inference runtime: {workers} workers x {intra_op} torch threads, batch size {batch_size}")
+    return executor
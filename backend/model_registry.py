@@ -0,0 +1,226 @@
+"""Registry of classification models with background loading and hot-swap.
+
+Models are configured by id and path (a HuggingFace model name or a local
+directory for offline use). A model is loaded and warmed up in a background
+thread, then swapped in atomically: requests already running keep the model
+they started with, new requests get the new one. The previously active model
+is kept as a warm standby so rollback is instant, and any model that is
+neither active nor standby is released once its in-flight requests finish.
+
+Config file (MODEL_REGISTRY_PATH, default models.json):
+    {"models": {"toxic-bert": "unitary/toxic-bert",
+                "toxic-bert-local": "models/toxic-bert"},
+     "active": "toxic-bert"}
+"""
+import gc
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+MODEL_REGISTRY_PATH = os.getenv("MODEL_REGISTRY_PATH", "models.json")
+DEFAULT_MODELS = {"toxic-bert": "unitary/toxic-bert"}
+ACTIVE_MODEL = os.getenv("ACTIVE_MODEL", "toxic-bert")
+MODEL_KEEP_STANDBY = os.getenv("MODEL_KEEP_STANDBY", "true").lower() == "true"
+
+WARMUP_TEXTS = [
+    "Hello, how are you today?",
+    "You are such an idiot.",
+    "Thanks for the help with the project! 👍"
+]
+
+
+class ModelEntry:
+    def __init__(self, model_id, path, model=None):
+        self.model_id = model_id
+        self.path = path
+        self.model = model
+        self.state = 'ready' if model is not None else 'registered'
+        self.error = None
+        self.refs = 0
+        self.load_seconds = None
+
+    def describe(self):
+        return {
+            'model_id': self.model_id,
+            'path': self.path,
+            'state': self.state,
+            'in_flight': self.refs,
+            'load_seconds': self.load_seconds,
+            'error': self.error
+        }
+
+
+class ModelRegistry:
+    """Holds the active model, a warm standby, and any candidates being loaded"""
+
+    def __init__(self, loader, keep_standby=MODEL_KEEP_STANDBY):
+        self._loader = loader
+        self.keep_standby = keep_standby
+        self._lock = threading.Lock()
+        self.entries = {}
+        self.active_id = None
+        self.previous_id = None
+        # Models kept loaded regardless of the swap, e.g. a shadow candidate
+        self.pinned = set()
+
+    def register(self, model_id, path, model=None):
+        """Register a model by id; an already loaded model object may be passed"""
+        with self._lock:
+            if model_id == self.active_id:
+                raise ValueError(f"Cannot re-register the active model {model_id}")
+            entry = self.entries.get(model_id)
+            if entry and entry.state in ('loading', 'ready') and entry.path == path and model is None:
+                return entry
+            self.entries[model_id] = entry = ModelEntry(model_id, path, model)
+            return entry
+
+    def load(self, model_id):
+        """Load and warm up a registered model in the calling thread"""
+        with self._lock:
+            entry = self.entries[model_id]
+            if entry.state in ('loading', 'ready'):
+                return entry.state == 'ready'
+            if entry.path is None:
+                # Registered with a ready-made model and nothing to load from
+                entry.state = 'failed'
+                entry.error = "Model has no path to load from"
+                return False
+            entry.state = 'loading'
+            entry.error = None
+        start = time.perf_counter()
+        try:
+            model = self._loader(entry.path)
+            for text in WARMUP_TEXTS:
+                model(text)
+        except Exception as e:
+            print(f"Error loading model {model_id} from {entry.path}: {e}")
+            with self._lock:
+                entry.state = 'failed'
+                entry.error = str(e)
+            return False
+        with self._lock:
+            entry.model = model
+            entry.state = 'ready'
+            entry.load_seconds = time.perf_counter() - start
+        print(f"Model {model_id} loaded and warmed up in {entry.load_seconds:.1f}s")
+        return True
+
+    def load_async(self, model_id):
+        thread = threading.Thread(target=self.load, args=(model_id,), daemon=True)
+        thread.start()
+        return thread
+
+    def activate(self, model_id, background=True):
+        """Load the model if needed, then atomically make it the serving model"""
+        if model_id not in self.entries:
+            raise KeyError(f"Unknown model id: {model_id}")
+
+        def _load_and_swap():
+            if self.load(model_id):
+                self._swap(model_id)
+
+        if not background:
+            _load_and_swap()
+            return None
+        thread = threading.Thread(target=_load_and_swap, daemon=True)
+        thread.start()
+        return thread
+
+    def rollback(self, background=True):
+        """Swap back to the previously active model"""
+        if not self.previous_id:
+            raise ValueError("No previous model to roll back to")
+        return self.activate(self.previous_id, background=background)
+
+    def _swap(self, model_id):
+        with self._lock:
+            if model_id == self.active_id:
+                return
+            retired = [self.previous_id]
+            self.previous_id = self.active_id
+            self.active_id = model_id
+            if not self.keep_standby:
+                retired.append(self.previous_id)
+            released = [self._release_if_idle(self.entries[retired_id])
+                        for retired_id in retired if retired_id and retired_id in self.entries]
+        print(f"Active model switched to {model_id} (previous: {self.previous_id})")
+        if any(released):
+            _collect_garbage()
+
+    def pin(self, model_id):
+        with self._lock:
+            self.pinned.add(model_id)
+
+    def unpin(self, model_id):
+        with self._lock:
+            self.pinned.discard(model_id)
+            released = model_id in self.entries and self._release_if_idle(self.entries[model_id])
+        if released:
+            _collect_garbage()
+
+    def _is_retained(self, entry):
+        if entry.model_id == self.active_id or entry.model_id in self.pinned:
+            return True
+        if entry.path is None:
+            # A model registered without a path could never be loaded again
+            return True
+        return self.keep_standby and entry.model_id == self.previous_id
+
+    def _release_if_idle(self, entry):
+        # Called with the lock held; returns True if the model was released
+        if entry.refs == 0 and entry.state == 'ready' and not self._is_retained(entry):
+            entry.model = None
+            entry.state = 'unloaded'
+            print(f"Released model {entry.model_id}")
+            return True
+        return False
+
+    @contextmanager
+    def use(self, model_id=None):
+        """Borrow a model (the active one by default): yields (model_id, model)"""
+        with self._lock:
+            model_id = model_id or self.active_id
+            if model_id is None:
+                raise RuntimeError("No active model")
+            entry = self.entries[model_id]
+            if entry.state != 'ready':
+                raise RuntimeError(f"Model {model_id} is not loaded ({entry.state})")
+            entry.refs += 1
+        try:
+            yield entry.model_id, entry.model
+        finally:
+            with self._lock:
+                entry.refs -= 1
+                released = self._release_if_idle(entry)
+            if released:
+                _collect_garbage()
+
+    def describe(self):
+        with self._lock:
+            return {
+                'active': self.active_id,
+                'previous': self.previous_id,
+                'pinned': sorted(self.pinned),
+                'models': [entry.describe() for entry in self.entries.values()]
+            }
+
+
+def _collect_garbage():
+    # A full collection can take a while with a large model graph; run it off
+    # the request thread and outside the registry lock
+    threading.Thread(target=gc.collect, daemon=True, name="model-release-gc").start()
+
+
+def load_registry_config(path=MODEL_REGISTRY_PATH):
+    """Return (models, active_id) from the config file, or the defaults"""
+    if os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                config = json.load(f)
+            models = config.get('models') or DEFAULT_MODELS
+            return models, config.get('active', ACTIVE_MODEL)
+        except Exception as e:
+            print(f"Error reading model registry config {path}: {e}")
+    return dict(DEFAULT_MODELS), ACTIVE_MODEL
@@ -0,0 +1,147 @@
+"""Opt-in request tracing, slow-request sampling and an on-demand sampling profiler.
+
+With PROFILING_ENABLED=true every request collects the time spent in named
+stages (model, lexicon, suggestion, storage). Requests slower than
+SLOW_REQUEST_MS are written with their input size and stage breakdown to a
+rotating log file. When profiling is disabled, `span` returns a shared no-op
+context manager and no request hooks are installed.
+
+The sampling profiler is independent of tracing: it samples every thread's
+stack for a bounded time and returns the stacks in folded format
+("frame;frame;frame count" per line), which flamegraph.pl and speedscope read.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from logging.handlers import RotatingFileHandler
+
+from flask import request
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+SLOW_REQUEST_LOG = os.getenv("SLOW_REQUEST_LOG", "logs/slow_requests.log")
+SLOW_REQUEST_LOG_BYTES = int(os.getenv("SLOW_REQUEST_LOG_BYTES", str(5 * 1024 * 1024)))
+SLOW_REQUEST_LOG_BACKUPS = int(os.getenv("SLOW_REQUEST_LOG_BACKUPS", "3"))
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "60"))
+
+_NULL_SPAN = nullcontext()
+_local = threading.local()
+_slow_logger = None
+_slow_logger_lock = threading.Lock()
+
+
+class _Span:
+    __slots__ = ('name', 'trace', 'start')
+
+    def __init__(self, name, trace):
+        self.name = name
+        self.trace = trace
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = (time.perf_counter() - self.start) * 1000
+        stage = self.trace.setdefault(self.name, [0.0, 0])
+        stage[0] += elapsed
+        stage[1] += 1
+        return False
+
+
+def span(name):
+    """Time a stage of the current request; a no-op unless profiling is enabled"""
+    if not PROFILING_ENABLED:
+        return _NULL_SPAN
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        return _NULL_SPAN
+    return _Span(name, trace)
+
+
+def _get_slow_logger():
+    global _slow_logger
+    with _slow_logger_lock:
+        if _slow_logger is not None:
+            return _slow_logger
+        os.makedirs(os.path.dirname(SLOW_REQUEST_LOG) or ".", exist_ok=True)
+        logger = logging.getLogger("slow_requests")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        handler = RotatingFileHandler(SLOW_REQUEST_LOG, maxBytes=SLOW_REQUEST_LOG_BYTES,
+                                      backupCount=SLOW_REQUEST_LOG_BACKUPS)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        _slow_logger = logger
+        return _slow_logger
+
+
+def _begin_trace():
+    _local.trace = {}
+    _local.start = time.perf_counter()
+
+
+def _end_trace(response):
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        return response
+    total_ms = (time.perf_counter() - _local.start) * 1000
+    _local.trace = None
+    if total_ms >= SLOW_REQUEST_MS:
+        _get_slow_logger().info(json.dumps({
+            'ts': round(time.time(), 3),
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'input_bytes': request.content_length or 0,
+            'total_ms': round(total_ms, 1),
+            'stages': {name: {'ms': round(ms, 1), 'calls': calls} for name, (ms, calls) in trace.items()}
+        }))
+    return response
+
+
+def install(app):
+    """Register per-request tracing hooks on the Flask app when enabled"""
+    if not PROFILING_ENABLED:
+        return
+    app.before_request(_begin_trace)
+    app.after_request(_end_trace)
+    print(f"Request profiling enabled (slow threshold {SLOW_REQUEST_MS}ms, log {SLOW_REQUEST_LOG})")
+
+
+_profiler_lock = threading.Lock()
+
+
+def _folded_stack(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def sample_profile(seconds, interval=0.005):
+    """Sample all thread stacks for `seconds`; return folded stacks, or None if busy"""
+    seconds = min(seconds, PROFILER_MAX_SECONDS)
+    if not _profiler_lock.acquire(blocking=False):
+        return None
+    try:
+        own_thread = threading.get_ident()
+        counts = {}
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                stack = f"{thread_names.get(thread_id, thread_id)};{_folded_stack(frame)}"
+                counts[stack] = counts.get(stack, 0) + 1
+            time.sleep(interval)
+        return "\n".join(f"{stack} {count}" for stack, count in sorted(counts.items())) + "\n"
+    finally:
+        _profiler_lock.release()
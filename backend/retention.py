@@ -0,0 +1,187 @@
+"""Retention policies for classification history.
+
+MongoDB history expires through a TTL index on `timestamp`. Local JSON history
+is compacted by a background thread: entries older than the retention window,
+or beyond the maximum entry count, are moved into one gzipped archive file per
+run and rolled up into per-day summaries. Archives are written outside the
+storage lock; writes only wait while history.json is snapshotted and, once,
+while it is rewritten. The pause time and bytes reclaimed per run are recorded.
+"""
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+HISTORY_RETENTION_DAYS = float(os.getenv("HISTORY_RETENTION_DAYS", "0"))
+HISTORY_MAX_ENTRIES = int(os.getenv("HISTORY_MAX_ENTRIES", "0"))
+HISTORY_ARCHIVE = os.getenv("HISTORY_ARCHIVE", "true").lower() == "true"
+COMPACTION_INTERVAL = float(os.getenv("COMPACTION_INTERVAL", "3600"))
+
+
+def retention_enabled():
+    return HISTORY_RETENTION_DAYS > 0 or HISTORY_MAX_ENTRIES > 0
+
+
+def parse_timestamp(value):
+    """Parse stored timestamps (datetime or str(datetime)); None if unparseable"""
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+class HistoryCompactor:
+    """Periodically moves expired local history entries into archives"""
+
+    def __init__(self, data_dir, lock, retention_days=HISTORY_RETENTION_DAYS,
+                 max_entries=HISTORY_MAX_ENTRIES, archive=HISTORY_ARCHIVE):
+        self.history_path = os.path.join(data_dir, "history.json")
+        self.summary_path = os.path.join(data_dir, "history_summary.json")
+        self.archive_dir = os.path.join(data_dir, "archive")
+        self.lock = lock
+        self.retention_days = retention_days
+        self.max_entries = max_entries
+        self.archive = archive
+        self._run_lock = threading.Lock()
+        self.stats = {
+            'runs': 0,
+            'entries_compacted': 0,
+            'bytes_reclaimed': 0,
+            'max_pause_ms': 0.0,
+            'last_run': None
+        }
+
+    def _select_expired(self, entries):
+        """Return the set of indices of entries that fall outside the retention policy"""
+        now = datetime.utcnow()
+        dated = sorted(
+            (parse_timestamp(entry.get('timestamp')) or now, i) for i, entry in enumerate(entries)
+        )
+        selected = set()
+        if self.max_entries > 0 and len(entries) > self.max_entries:
+            selected.update(i for _, i in dated[:len(entries) - self.max_entries])
+        if self.retention_days > 0:
+            cutoff = now - timedelta(days=self.retention_days)
+            selected.update(i for ts, i in dated if ts < cutoff)
+        return selected
+
+    def _read_history(self):
+        if not os.path.exists(self.history_path):
+            return None
+        with open(self.history_path, 'r') as f:
+            return json.load(f)
+
+    def _compact(self):
+        """Archive and drop expired entries; return (entries, bytes, pause_ms)
+
+        The storage lock is held only to snapshot history.json and, after the
+        archive is written, to rewrite it without the archived entries. Writers
+        only append (or clear the file), so entries added in between are kept.
+        """
+        with self.lock:
+            start = time.perf_counter()
+            snapshot = self._read_history()
+            selected = self._select_expired(snapshot) if snapshot else set()
+            pause_ms = (time.perf_counter() - start) * 1000
+        if not selected:
+            return [], 0, pause_ms
+        compacted = [entry for i, entry in enumerate(snapshot) if i in selected]
+        if self.archive:
+            self._write_archive(compacted)
+        with self.lock:
+            start = time.perf_counter()
+            size_before = os.path.getsize(self.history_path)
+            entries = self._read_history() or []
+            # If history was cleared meanwhile, the archived entries are already gone
+            if len(entries) >= len(snapshot) and all(entries[i] == snapshot[i] for i in selected):
+                remaining = [entry for i, entry in enumerate(entries) if i not in selected]
+                with open(self.history_path, 'w') as f:
+                    json.dump(remaining, f, default=str)
+            reclaimed = size_before - os.path.getsize(self.history_path)
+            pause_ms += (time.perf_counter() - start) * 1000
+        return compacted, reclaimed, pause_ms
+
+    def _write_archive(self, entries):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        name = f"history-{datetime.utcnow().strftime('%Y%m%d-%H%M%S-%f')}.jsonl.gz"
+        with gzip.open(os.path.join(self.archive_dir, name), 'wt', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, default=str) + "\n")
+
+    def _update_summary(self, entries):
+        """Roll compacted entries into per-day counts by classification"""
+        summary = {}
+        if os.path.exists(self.summary_path):
+            try:
+                with open(self.summary_path, 'r') as f:
+                    summary = json.load(f)
+            except ValueError:
+                summary = {}
+        for entry in entries:
+            ts = parse_timestamp(entry.get('timestamp'))
+            day = summary.setdefault(ts.strftime('%Y-%m-%d') if ts else 'unknown', {
+                'total': 0, 'by_classification': {}, 'confidence_sum': 0.0
+            })
+            day['total'] += 1
+            classification = entry.get('classification', 'unknown')
+            day['by_classification'][classification] = day['by_classification'].get(classification, 0) + 1
+            if isinstance(entry.get('confidence'), (int, float)):
+                day['confidence_sum'] += entry['confidence']
+        with open(self.summary_path, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+    def run_once(self):
+        """Run one compaction pass; return this run's report"""
+        with self._run_lock:
+            compacted, reclaimed, pause_ms = self._compact()
+            if compacted:
+                # Summaries are only touched by the compactor, so no storage lock is needed
+                self._update_summary(compacted)
+            report = {'entries_compacted': len(compacted), 'bytes_reclaimed': reclaimed, 'pause_ms': pause_ms}
+            self.stats['runs'] += 1
+            self.stats['entries_compacted'] += report['entries_compacted']
+            self.stats['bytes_reclaimed'] += report['bytes_reclaimed']
+            self.stats['max_pause_ms'] = max(self.stats['max_pause_ms'], pause_ms)
+            self.stats['last_run'] = {**report, 'finished_at': datetime.utcnow().isoformat()}
+        if report['entries_compacted']:
+            print(f"History compaction: {report['entries_compacted']} entries archived, "
+                  f"{report['bytes_reclaimed']} bytes reclaimed, pause {report['pause_ms']:.1f}ms")
+        return report
+
+    def start(self, interval=COMPACTION_INTERVAL):
+        """Run compaction periodically in a daemon thread"""
+        def _loop():
+            while True:
+                try:
+                    self.run_once()
+                except Exception as e:
+                    print(f"Error compacting history: {e}")
+                time.sleep(interval)
+        thread = threading.Thread(target=_loop, daemon=True, name="history-compactor")
+        thread.start()
+        return thread
+
+    def get_stats(self):
+        return {
+            'retention_days': self.retention_days,
+            'max_entries': self.max_entries,
+            'archive': self.archive,
+            **self.stats
+        }
+
+
+def ensure_ttl_index(db, collection, retention_days=HISTORY_RETENTION_DAYS):
+    """Create (or update) a TTL index expiring documents by `timestamp`"""
+    import pymongo
+    ttl_seconds = int(retention_days * 86400)
+    try:
+        collection.create_index('timestamp', expireAfterSeconds=ttl_seconds)
+    except pymongo.errors.OperationFailure:
+        # The index already exists with a different TTL; update it in place
+        db.command('collMod', collection.name,
+                   index={'keyPattern': {'timestamp': 1}, 'expireAfterSeconds': ttl_seconds})
+    print(f"History TTL index set to {retention_days} days")
@@ -0,0 +1,194 @@
+"""Shadow evaluation of a candidate model on live traffic.
+
+A configurable fraction of classify requests is re-scored by a candidate
+model in a background executor after the primary response has been built.
+Each comparison is appended as one compact JSON line (no text is stored):
+
+    {"ts": ..., "pm": primary model, "cm": candidate model, "n": text length,
+     "p": primary label, "c": candidate label, "ps": primary score,
+     "cs": candidate score, "pl": primary ms, "cl": candidate ms}
+
+Shadow work is shed (never queued) when the executor backlog is full or the
+CPU is saturated, so it cannot add latency to primary responses.
+
+Usage:
+    python shadow.py report [log_path]
+"""
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from inference_runtime import available_cores
+
+# Also run as a command, so load backend/.env before reading settings
+load_dotenv()
+
+SHADOW_MODEL = os.getenv("SHADOW_MODEL", "")
+SHADOW_FRACTION = float(os.getenv("SHADOW_FRACTION", "0.1"))
+SHADOW_LOG_PATH = os.getenv("SHADOW_LOG_PATH", "data/shadow_log.jsonl")
+SHADOW_MAX_PENDING = int(os.getenv("SHADOW_MAX_PENDING", "16"))
+# Shed shadow work when the 1-minute load average per core exceeds this
+SHADOW_MAX_LOAD = float(os.getenv("SHADOW_MAX_LOAD", "0.8"))
+
+
+def cpu_saturated(max_load=SHADOW_MAX_LOAD):
+    """Return True when the normalized 1-minute load average exceeds max_load"""
+    try:
+        load = os.getloadavg()[0]
+    except (AttributeError, OSError):
+        # getloadavg is unavailable on Windows; rely on the backlog cap only
+        return False
+    # Affinity-aware, so a container limited to a few cores is not under-reported
+    return load / len(available_cores()) > max_load
+
+
+class ShadowEvaluator:
+    """Scores sampled requests with a candidate model off the request path"""
+
+    def __init__(self, registry, model_id, rule, fraction=SHADOW_FRACTION,
+                 log_path=SHADOW_LOG_PATH, max_pending=SHADOW_MAX_PENDING):
+        self.registry = registry
+        self.model_id = model_id
+        self.rule = rule
+        self.fraction = fraction
+        self.log_path = log_path
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.stats = {'sampled': 0, 'completed': 0, 'shed_backlog': 0, 'shed_cpu': 0, 'errors': 0}
+
+    def submit(self, text, outcome, primary_ms):
+        """Maybe schedule shadow scoring for a finished primary classification"""
+        if outcome.get('stage', 'bert') != 'bert':
+            # Cascade-decided outcomes have no primary model score or latency
+            return False
+        if random.random() >= self.fraction:
+            return False
+        if self.registry.entries[self.model_id].state != 'ready':
+            return False
+        with self._lock:
+            self.stats['sampled'] += 1
+            if self.pending >= self.max_pending:
+                self.stats['shed_backlog'] += 1
+                return False
+            if cpu_saturated():
+                self.stats['shed_cpu'] += 1
+                return False
+            self.pending += 1
+        self._executor.submit(self._score, text, outcome, primary_ms)
+        return True
+
+    def _score(self, text, outcome, primary_ms):
+        try:
+            start = time.perf_counter()
+            with self.registry.use(self.model_id) as (model_id, model):
+                result = model(text)[0]
+            candidate_ms = (time.perf_counter() - start) * 1000
+            candidate_score = result['score']
+            record = {
+                'ts': round(time.time(), 3),
+                'pm': outcome['model_id'],
+                'cm': model_id,
+                'n': len(text),
+                'p': outcome['classification'],
+                'c': self.rule(candidate_score, outcome['toxic_words']),
+                'ps': round(float(outcome['confidence']), 4),
+                'cs': round(float(candidate_score), 4),
+                'pl': round(primary_ms, 1),
+                'cl': round(candidate_ms, 1)
+            }
+            self._append(record)
+            with self._lock:
+                self.stats['completed'] += 1
+        except Exception as e:
+            print(f"Error in shadow scoring: {e}")
+            with self._lock:
+                self.stats['errors'] += 1
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def _append(self, record):
+        os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+        with open(self.log_path, 'a') as f:
+            f.write(json.dumps(record, separators=(',', ':')) + "\n")
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'enabled': True,
+                'candidate': self.model_id,
+                'fraction': self.fraction,
+                'pending': self.pending,
+                **self.stats
+            }
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def summarize(records):
+    """Summarize agreement, score deltas and latency from shadow records"""
+    by_label = {}
+    for record in records:
+        group = by_label.setdefault(record['p'], {'count': 0, 'agree': 0, 'candidate_labels': {}, 'deltas': []})
+        group['count'] += 1
+        group['agree'] += record['p'] == record['c']
+        group['candidate_labels'][record['c']] = group['candidate_labels'].get(record['c'], 0) + 1
+        group['deltas'].append(abs(record['cs'] - record['ps']))
+    total = len(records)
+    agree = sum(group['agree'] for group in by_label.values())
+    primary_ms = [record['pl'] for record in records]
+    candidate_ms = [record['cl'] for record in records]
+    return {
+        'records': total,
+        'agreement': agree / total if total else None,
+        'mean_abs_score_delta': sum(abs(r['cs'] - r['ps']) for r in records) / total if total else None,
+        'latency_ms': {
+            'primary_p50': _percentile(primary_ms, 0.5),
+            'primary_p95': _percentile(primary_ms, 0.95),
+            'candidate_p50': _percentile(candidate_ms, 0.5),
+            'candidate_p95': _percentile(candidate_ms, 0.95)
+        },
+        'by_classification': {
+            label: {
+                'count': group['count'],
+                'disagreement': 1 - group['agree'] / group['count'],
+                'candidate_labels': group['candidate_labels'],
+                'mean_abs_score_delta': sum(group['deltas']) / len(group['deltas'])
+            }
+            for label, group in by_label.items()
+        }
+    }
+
+
+def report(log_path=SHADOW_LOG_PATH):
+    records = []
+    if os.path.exists(log_path):
+        with open(log_path, 'r') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    summary = summarize(records)
+    print(json.dumps(summary, indent=2))
+    return summary
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'report':
+        print("Usage: python shadow.py report [log_path]")
+        sys.exit(1)
+    report(sys.argv[2] if len(sys.argv) > 2 else SHADOW_LOG_PATH)
@@ -0,0 +1,109 @@
+import io
+import threading
+import time
+
+from flask import Flask, request, jsonify
+
+import admission
+from admission import AdmissionController, RateLimiter, TokenBucket, INTERACTIVE, BULK
+
+
+def test_token_bucket_allows_burst_then_reports_refill_time():
+    bucket = TokenBucket(rate=1.0, burst=2)
+    assert bucket.take() == 0.0
+    assert bucket.take() == 0.0
+    retry_after = bucket.take()
+    assert 0.0 < retry_after <= 1.0
+
+
+def test_token_bucket_refills_over_time():
+    bucket = TokenBucket(rate=100.0, burst=1)
+    assert bucket.take() == 0.0
+    time.sleep(0.03)
+    assert bucket.take() == 0.0
+
+
+def test_rate_limiter_is_per_client_and_per_priority():
+    limiter = RateLimiter({INTERACTIVE: (1.0, 1), BULK: (1.0, 1)})
+    assert limiter.allow('a', INTERACTIVE) == (True, 0.0)
+    assert limiter.allow('a', INTERACTIVE)[0] is False
+    assert limiter.allow('b', INTERACTIVE) == (True, 0.0)
+    assert limiter.allow('a', BULK) == (True, 0.0)
+    assert limiter.rejected[INTERACTIVE] == 1
+
+
+def test_rate_limiter_zero_rate_disables_limiting():
+    limiter = RateLimiter({INTERACTIVE: (0, 1)})
+    assert all(limiter.allow('a', INTERACTIVE)[0] for _ in range(10))
+
+
+def test_admission_sheds_when_expected_wait_exceeds_budget():
+    controller = AdmissionController(2, 1, {INTERACTIVE: 0.3, BULK: 0.3})
+    assert controller.acquire(BULK) == (True, 0.0)
+    # Bulk is capped at one slot and its estimated service time is above budget
+    admitted, retry_after = controller.acquire(BULK)
+    assert not admitted and retry_after > 0.3
+    assert controller.acquire(INTERACTIVE) == (True, 0.0)
+    assert controller.acquire(INTERACTIVE)[0] is False
+    assert controller.shed == {INTERACTIVE: 1, BULK: 1}
+
+
+def test_admission_waiter_gets_released_slot():
+    controller = AdmissionController(1, 1, {INTERACTIVE: 2.0, BULK: 2.0})
+    assert controller.acquire(INTERACTIVE)[0]
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(controller.acquire(INTERACTIVE)))
+    waiter.start()
+    time.sleep(0.05)
+    controller.release(INTERACTIVE, 0.01)
+    waiter.join(timeout=2)
+    assert results == [(True, 0.0)]
+    assert controller.inflight[INTERACTIVE] == 1
+
+
+def test_bulk_yields_to_waiting_interactive():
+    controller = AdmissionController(2, 2, {INTERACTIVE: 2.0, BULK: 0.2})
+    controller.service_time[BULK] = 0.01
+    assert controller.acquire(INTERACTIVE)[0]
+    assert controller.acquire(INTERACTIVE)[0]
+    waiter = threading.Thread(target=controller.acquire, args=(INTERACTIVE,))
+    waiter.start()
+    time.sleep(0.05)
+    controller.release(INTERACTIVE, 0.01)
+    # The freed slot goes to the waiting interactive request, not to bulk
+    assert controller.acquire(BULK)[0] is False
+    waiter.join(timeout=2)
+    assert controller.inflight == {INTERACTIVE: 2, BULK: 0}
+
+
+def _make_app(monkeypatch):
+    monkeypatch.setattr(admission, 'rate_limiter', RateLimiter({INTERACTIVE: (100, 100), BULK: (100, 100)}))
+    monkeypatch.setattr(admission, 'admission', AdmissionController(1, 1, {INTERACTIVE: 1.0, BULK: 1.0}))
+    app = Flask(__name__)
+    app.config['MAX_CONTENT_LENGTH'] = 100
+
+    @app.route('/upload', methods=['POST'])
+    @admission.admission_controlled(BULK)
+    def upload():
+        try:
+            return jsonify({"size": len(request.files['file'].read())})
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    return app
+
+
+def test_oversized_upload_gets_413_without_taking_a_slot(monkeypatch):
+    app = _make_app(monkeypatch)
+    response = app.test_client().post('/upload', data={'file': (io.BytesIO(b'x' * 500), 'a.txt')})
+    assert response.status_code == 413
+    assert admission.admission.admitted[BULK] == 0
+
+
+def test_overloaded_request_gets_503_with_retry_after(monkeypatch):
+    app = _make_app(monkeypatch)
+    admission.admission.acquire(BULK)
+    admission.admission.service_time[BULK] = 10.0
+    response = app.test_client().post('/upload', data={})
+    assert response.status_code == 503
+    assert int(response.headers['Retry-After']) >= 1
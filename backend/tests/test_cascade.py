@@ -0,0 +1,72 @@
+import pytest
+
+from cascade import CascadeFilter, FEEDBACK_WEIGHT, HashedLinearModel, collect_training_samples
+
+
+class FixedModel:
+    def __init__(self, score):
+        self.score = score
+
+    def predict(self, text):
+        return self.score
+
+
+@pytest.mark.parametrize('score, expected', [
+    (0.0, ('neutral', 0.0, 'linear')),
+    (0.05, ('neutral', 0.05, 'linear')),
+    (0.06, None),
+    (0.94, None),
+    (0.95, ('toxic', 0.95, 'linear')),
+    (1.0, ('toxic', 1.0, 'linear')),
+])
+def test_band_decisions(score, expected):
+    cascade = CascadeFilter(FixedModel(score), low=0.05, high=0.95)
+    assert cascade.decide("some text", []) == expected
+
+
+def test_lexicon_hit_short_circuits_with_linear_score():
+    cascade = CascadeFilter(FixedModel(0.3), low=0.05, high=0.95)
+    assert cascade.decide("you idiot", ['idiot']) == ('toxic', 0.3, 'lexicon')
+
+
+def test_stats_count_stages_and_bert_skip_rate():
+    cascade = CascadeFilter(FixedModel(0.5), low=0.05, high=0.95)
+    cascade.decide("unsure", [])
+    cascade.decide("unsure", [])
+    cascade.decide("you idiot", ['idiot'])
+    cascade.model = FixedModel(0.01)
+    cascade.decide("hello", [])
+    stats = cascade.get_stats()
+    assert (stats['lexicon'], stats['linear'], stats['bert'], stats['total']) == (1, 1, 2, 4)
+    assert stats['bert_skip_rate'] == 0.5
+    assert stats['band'] == [0.05, 0.95]
+
+
+def test_empty_stats_have_zero_skip_rate():
+    assert CascadeFilter(FixedModel(0.5)).get_stats()['bert_skip_rate'] == 0.0
+
+
+def test_training_skips_cascade_decided_rows():
+    history = [
+        {'text': 'scored by bert', 'confidence': 0.7, 'stage': 'bert'},
+        {'text': 'stored before the cascade', 'confidence': 0.2},
+        {'text': 'decided by lexicon', 'confidence': 0.4, 'stage': 'lexicon'},
+        {'text': 'decided by linear', 'confidence': 0.01, 'stage': 'linear'},
+        {'text': '', 'confidence': 0.5},
+    ]
+    feedback = [
+        {'original_text': 'corrected', 'correct_classification': 'toxic'},
+        {'original_text': 'unknown label', 'correct_classification': 'spam'},
+    ]
+    samples = collect_training_samples(history, feedback)
+    assert samples == [('scored by bert', 0.7), ('stored before the cascade', 0.2)] + \
+        [('corrected', 1.0)] * FEEDBACK_WEIGHT
+
+
+def test_linear_model_save_and_load(tmp_path):
+    model = HashedLinearModel().fit([("you are an idiot", 1.0), ("have a nice day", 0.0)] * 5)
+    path = str(tmp_path / "cascade.npz")
+    model.save(path)
+    loaded = HashedLinearModel.load(path)
+    assert abs(loaded.predict("you are an idiot") - model.predict("you are an idiot")) < 1e-6
+    assert loaded.predict("you are an idiot") > 0.5 > loaded.predict("have a nice day")
@@ -0,0 +1,94 @@
+import json
+import sys
+import types
+
+import distill
+from cascade import HashedLinearModel
+from model_registry import ModelRegistry
+
+
+class StubTeacher:
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, text):
+        return [{"label": "toxic", "score": 0.9 if "idiot" in text else 0.1}]
+
+
+def rule(score, toxic_words):
+    return 'toxic' if score > 0.5 else 'neutral'
+
+
+def fake_app(monkeypatch):
+    registry = ModelRegistry(StubTeacher)
+    registry.register('toxic-bert', 'unitary/toxic-bert')
+    app = types.SimpleNamespace(model_registry=registry, determine_classification=rule,
+                                find_toxic_words=lambda text: [])
+    monkeypatch.setitem(sys.modules, 'app', app)
+    return app
+
+
+def trained_student():
+    samples = [("you are an idiot", 1.0), ("have a nice day", 0.0)] * 5
+    return distill.StudentClassifier(HashedLinearModel().fit(samples))
+
+
+def test_student_matches_pipeline_interface():
+    student = trained_student()
+    [single] = student("you are an idiot")
+    assert single['label'] == 'toxic' and single['score'] > 0.5
+    batch = student(["you are an idiot", "have a nice day"])
+    assert [result['score'] > 0.5 for result in batch] == [True, False]
+
+
+def test_load_student_round_trip(tmp_path):
+    student = trained_student()
+    student.model.save(str(tmp_path / distill.STUDENT_WEIGHTS))
+    with open(tmp_path / distill.STUDENT_CONFIG, 'w') as f:
+        json.dump({'weights': distill.STUDENT_WEIGHTS, 'label': 'toxic'}, f)
+    assert distill.is_student_artifact(str(tmp_path))
+    loaded = distill.load_student(str(tmp_path))
+    for text in ("you are an idiot", "have a nice day"):
+        assert abs(loaded(text)[0]['score'] - student(text)[0]['score']) < 1e-6
+
+
+def test_evaluate_student_reports_agreement():
+    student = trained_student()
+    holdout = ["you are an idiot", "have a nice day"]
+    report = distill.evaluate_student(student, holdout, [0.9, 0.9], 0.01, rule, lambda text: [])
+    assert report['holdout_texts'] == 2
+    assert report['label_agreement'] == 0.5
+    assert report['teacher_ms_per_text'] == 10
+
+
+def test_evaluate_student_without_holdout():
+    report = distill.evaluate_student(trained_student(), [], [], 0.0, rule, lambda text: [])
+    assert report['label_agreement'] is None and report['mean_abs_score_delta'] is None
+
+
+def test_distill_excludes_feedback_for_held_out_texts(tmp_path, monkeypatch):
+    fake_app(monkeypatch)
+    texts = [f"message number {i}" for i in range(10)]
+    history = [{'text': text} for text in texts]
+    feedback = [{'original_text': text, 'correct_classification': 'neutral'} for text in texts]
+    monkeypatch.setattr(distill, 'load_training_entries', lambda: (history, feedback))
+    report = distill.distill(str(tmp_path))
+    with open(tmp_path / distill.STUDENT_CONFIG) as f:
+        config = json.load(f)
+    assert report['holdout_texts'] == 2
+    # 8 teacher-labelled texts plus their corrections; the 2 held-out corrections are dropped
+    assert config['training_samples'] == 8 + 8 * distill.FEEDBACK_WEIGHT
+
+
+def test_distill_refuses_when_nothing_is_left_to_train_on(tmp_path, monkeypatch):
+    fake_app(monkeypatch)
+    monkeypatch.setattr(distill, 'load_training_entries', lambda: ([{'text': 'only one'}], []))
+    assert distill.distill(str(tmp_path / "student")) is None
+    assert not (tmp_path / "student").exists()
+
+
+def test_distill_refuses_unregistered_teacher(tmp_path, monkeypatch):
+    fake_app(monkeypatch)
+    history = [{'text': f"message {i}"} for i in range(10)]
+    monkeypatch.setattr(distill, 'load_training_entries', lambda: (history, []))
+    assert distill.distill(str(tmp_path / "student"), teacher_id='missing') is None
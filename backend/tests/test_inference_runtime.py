@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+from inference_runtime import InferenceExecutor, InferenceQueueFull
+
+
+class StubModel:
+    """Accepts a string or a list, like the transformers pipeline"""
+
+    def __init__(self, max_length=None, gate=None):
+        self.max_length = max_length
+        self.gate = gate
+        self.calls = []
+
+    def __call__(self, text):
+        if self.gate is not None:
+            self.gate.wait()
+        self.calls.append(text)
+        texts = text if isinstance(text, list) else [text]
+        if self.max_length and any(len(item) > self.max_length for item in texts):
+            raise ValueError("input too long")
+        return [{"label": "toxic", "score": len(item) / 100} for item in texts]
+
+
+def submit_batch(executor, model, texts):
+    # Queue everything while the single worker is blocked on the first item,
+    # so the remaining texts are drained as one micro-batch
+    futures = [executor.submit(model, text) for text in texts]
+    model.gate.set()
+    return futures
+
+
+def test_classify_returns_result_for_text():
+    executor = InferenceExecutor(1, batch_size=4)
+    try:
+        assert executor.classify(StubModel(), "hello") == [{"label": "toxic", "score": 0.05}]
+    finally:
+        executor.shutdown()
+
+
+def test_queued_requests_are_micro_batched():
+    model = StubModel(gate=threading.Event())
+    executor = InferenceExecutor(1, batch_size=8)
+    try:
+        futures = submit_batch(executor, model, ["a" * i for i in range(1, 8)])
+        assert [f.result(timeout=2)[0]['score'] for f in futures] == [i / 100 for i in range(1, 8)]
+        assert any(isinstance(call, list) and len(call) > 1 for call in model.calls)
+    finally:
+        executor.shutdown()
+
+
+def test_failing_input_only_fails_its_own_request():
+    model = StubModel(max_length=5, gate=threading.Event())
+    executor = InferenceExecutor(1, batch_size=8)
+    try:
+        texts = ["ok", "fine", "x" * 50, "good", "nice"]
+        futures = submit_batch(executor, model, texts)
+        with pytest.raises(ValueError):
+            futures[2].result(timeout=2)
+        for i in (0, 1, 3, 4):
+            assert futures[i].result(timeout=2)[0]['score'] == len(texts[i]) / 100
+    finally:
+        executor.shutdown()
+
+
+def test_full_queue_raises_queue_full():
+    model = StubModel(gate=threading.Event())
+    executor = InferenceExecutor(1, batch_size=1, queue_size=1, queue_timeout=0.05)
+    try:
+        executor.submit(model, "first")
+        # Give the worker time to take the first item, then fill the queue
+        for _ in range(100):
+            if executor.get_stats()['queued'] == 0:
+                break
+            time.sleep(0.01)
+        executor.submit(model, "second")
+        with pytest.raises(InferenceQueueFull):
+            executor.submit(model, "third")
+        assert executor.get_stats()['rejected'] == 1
+    finally:
+        model.gate.set()
+        executor.shutdown()
@@ -0,0 +1,138 @@
+import pytest
+
+from model_registry import ModelRegistry
+
+
+class StubModel:
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, text):
+        return [{"label": "toxic", "score": 0.5}]
+
+
+def make_registry(keep_standby=True, **models):
+    registry = ModelRegistry(StubModel, keep_standby=keep_standby)
+    for model_id, path in models.items():
+        registry.register(model_id, path)
+    return registry
+
+
+def test_activate_loads_and_swaps():
+    registry = make_registry(a='A', b='B')
+    registry.activate('a', background=False)
+    registry.activate('b', background=False)
+    assert (registry.active_id, registry.previous_id) == ('b', 'a')
+    with registry.use() as (model_id, model):
+        assert model_id == 'b' and model.path == 'B'
+
+
+def test_in_flight_request_keeps_its_model_across_swap():
+    registry = make_registry(keep_standby=False, a='A', b='B')
+    registry.activate('a', background=False)
+    with registry.use() as (model_id, model):
+        registry.activate('b', background=False)
+        # The old model is retired but not released while still in use
+        assert registry.entries['a'].state == 'ready'
+        assert model.path == 'A'
+    assert registry.entries['a'].state == 'unloaded'
+    assert registry.entries['a'].model is None
+
+
+def test_standby_is_kept_and_older_models_released():
+    registry = make_registry(a='A', b='B', c='C')
+    for model_id in ('a', 'b', 'c'):
+        registry.activate(model_id, background=False)
+    assert registry.entries['a'].state == 'unloaded'
+    assert registry.entries['b'].state == 'ready'
+
+
+def test_rollback_swaps_back_to_previous():
+    registry = make_registry(a='A', b='B')
+    registry.activate('a', background=False)
+    registry.activate('b', background=False)
+    registry.rollback(background=False)
+    assert (registry.active_id, registry.previous_id) == ('a', 'b')
+
+
+def test_rollback_reloads_released_previous_model():
+    registry = make_registry(keep_standby=False, a='A', b='B')
+    registry.activate('a', background=False)
+    registry.activate('b', background=False)
+    assert registry.entries['a'].state == 'unloaded'
+    registry.rollback(background=False)
+    assert registry.active_id == 'a'
+    assert registry.entries['a'].state == 'ready'
+
+
+def test_rollback_without_previous_fails():
+    registry = make_registry(a='A')
+    registry.activate('a', background=False)
+    with pytest.raises(ValueError):
+        registry.rollback()
+
+
+def test_failed_load_does_not_swap():
+    def loader(path):
+        if path == 'broken':
+            raise OSError("no such model")
+        return StubModel(path)
+
+    registry = ModelRegistry(loader)
+    registry.register('a', 'A')
+    registry.register('bad', 'broken')
+    registry.activate('a', background=False)
+    registry.activate('bad', background=False)
+    assert registry.active_id == 'a'
+    assert registry.entries['bad'].state == 'failed'
+
+
+def test_unknown_or_active_model_is_rejected():
+    registry = make_registry(a='A')
+    registry.activate('a', background=False)
+    with pytest.raises(KeyError):
+        registry.activate('missing')
+    with pytest.raises(ValueError):
+        registry.register('a', 'elsewhere')
+
+
+def test_pinned_model_is_not_released():
+    registry = make_registry(keep_standby=False, a='A', b='B', shadow='S')
+    registry.pin('shadow')
+    registry.load('shadow')
+    registry.activate('a', background=False)
+    with registry.use('shadow') as (model_id, model):
+        assert model.path == 'S'
+    assert registry.entries['shadow'].state == 'ready'
+    registry.unpin('shadow')
+    assert registry.entries['shadow'].state == 'unloaded'
+
+
+def test_model_without_path_is_never_released():
+    registry = make_registry(a='A', b='B')
+    registry.register('fallback', None, model=StubModel(None))
+    for model_id in ('fallback', 'a', 'b'):
+        registry.activate(model_id, background=False)
+    assert registry.entries['fallback'].state == 'ready'
+    registry.activate('fallback', background=False)
+    assert registry.active_id == 'fallback'
+
+
+def test_model_without_path_is_not_loaded():
+    loaded = []
+    registry = ModelRegistry(lambda path: loaded.append(path) or StubModel(path))
+    registry.register('fallback', None)
+    assert not registry.load('fallback')
+    assert registry.entries['fallback'].state == 'failed'
+    assert loaded == []
+
+
+def test_release_collects_garbage_off_the_lock(monkeypatch):
+    import model_registry
+    collected = []
+    monkeypatch.setattr(model_registry, '_collect_garbage',
+                        lambda: collected.append(registry._lock.locked()))
+    registry = make_registry(keep_standby=False, a='A', b='B')
+    registry.activate('a', background=False)
+    registry.activate('b', background=False)
+    assert collected == [False]
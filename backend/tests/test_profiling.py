@@ -0,0 +1,100 @@
+import json
+import logging
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+import pytest
+from flask import Flask
+
+import profiling
+
+
+@pytest.fixture
+def slow_log(tmp_path, monkeypatch):
+    log_path = tmp_path / "slow.log"
+    monkeypatch.setattr(profiling, 'PROFILING_ENABLED', True)
+    monkeypatch.setattr(profiling, 'SLOW_REQUEST_LOG', str(log_path))
+    monkeypatch.setattr(profiling, '_slow_logger', None)
+    yield log_path
+    logger = logging.getLogger("slow_requests")
+    for handler in [h for h in logger.handlers if isinstance(h, RotatingFileHandler)]:
+        logger.removeHandler(handler)
+        handler.close()
+
+
+def test_span_is_a_no_op_when_disabled(monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILING_ENABLED', False)
+    profiling._begin_trace()
+    with profiling.span('model'):
+        pass
+    assert profiling._local.trace == {}
+    profiling._local.trace = None
+
+
+def test_span_accumulates_stage_time(monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILING_ENABLED', True)
+    profiling._begin_trace()
+    for _ in range(2):
+        with profiling.span('model'):
+            time.sleep(0.002)
+    ms, calls = profiling._local.trace['model']
+    assert calls == 2 and ms >= 4
+    profiling._local.trace = None
+
+
+def test_slow_request_is_logged_with_stages(slow_log, monkeypatch):
+    monkeypatch.setattr(profiling, 'SLOW_REQUEST_MS', 0)
+    app = Flask(__name__)
+    with app.test_request_context('/api/content/classify', method='POST', data='some text'):
+        profiling._begin_trace()
+        with profiling.span('model'):
+            pass
+        response = profiling._end_trace(app.response_class(status=200))
+    assert response.status_code == 200
+    record = json.loads(slow_log.read_text().strip())
+    assert record['path'] == '/api/content/classify'
+    assert record['input_bytes'] == len('some text')
+    assert record['stages']['model']['calls'] == 1
+
+
+def test_fast_request_is_not_logged(slow_log, monkeypatch):
+    monkeypatch.setattr(profiling, 'SLOW_REQUEST_MS', 60000)
+    app = Flask(__name__)
+    with app.test_request_context('/'):
+        profiling._begin_trace()
+        profiling._end_trace(app.response_class(status=200))
+    assert not slow_log.exists()
+
+
+def test_slow_logger_is_created_once(slow_log):
+    threads = [threading.Thread(target=profiling._get_slow_logger) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    handlers = logging.getLogger("slow_requests").handlers
+    assert sum(isinstance(handler, RotatingFileHandler) for handler in handlers) == 1
+
+
+def test_sample_profile_returns_folded_stacks():
+    stop = threading.Event()
+
+    def busy_waiting_worker():
+        stop.wait()
+
+    worker = threading.Thread(target=busy_waiting_worker, name="worker")
+    worker.start()
+    try:
+        profile = profiling.sample_profile(0.05, interval=0.01)
+    finally:
+        stop.set()
+        worker.join()
+    lines = [line for line in profile.splitlines() if line.startswith("worker;")]
+    assert lines and all("busy_waiting_worker" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+def test_sample_profile_refuses_concurrent_sessions():
+    with profiling._profiler_lock:
+        assert profiling.sample_profile(0.01) is None
@@ -0,0 +1,77 @@
+import gzip
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+from retention import HistoryCompactor
+
+
+def write_history(data_dir, count, days_old_start):
+    now = datetime.utcnow()
+    entries = [{
+        'text': str(i),
+        'classification': 'toxic' if i % 2 else 'neutral',
+        'confidence': 0.5,
+        'timestamp': str(now - timedelta(days=days_old_start - i))
+    } for i in range(count)]
+    with open(os.path.join(data_dir, "history.json"), 'w') as f:
+        json.dump(entries, f)
+
+
+def read_archives(data_dir):
+    archive_dir = os.path.join(data_dir, "archive")
+    entries = []
+    for name in os.listdir(archive_dir):
+        with gzip.open(os.path.join(archive_dir, name), 'rt', encoding='utf-8') as f:
+            entries.extend(json.loads(line) for line in f)
+    return os.listdir(archive_dir), entries
+
+
+def test_compaction_is_a_single_pass(tmp_path):
+    write_history(str(tmp_path), 200, 200)
+    compactor = HistoryCompactor(str(tmp_path), threading.Lock(), retention_days=30, max_entries=20)
+    report = compactor.run_once()
+    assert report['entries_compacted'] == 180
+    assert report['bytes_reclaimed'] > 0
+    with open(tmp_path / "history.json") as f:
+        remaining = json.load(f)
+    assert [entry['text'] for entry in remaining] == [str(i) for i in range(180, 200)]
+    names, archived = read_archives(str(tmp_path))
+    assert len(names) == 1 and len(archived) == 180
+    with open(tmp_path / "history_summary.json") as f:
+        summary = json.load(f)
+    assert sum(day['total'] for day in summary.values()) == 180
+
+
+def test_compaction_without_expired_entries_is_a_no_op(tmp_path):
+    write_history(str(tmp_path), 10, 5)
+    compactor = HistoryCompactor(str(tmp_path), threading.Lock(), retention_days=30)
+    assert compactor.run_once()['entries_compacted'] == 0
+    assert not (tmp_path / "archive").exists()
+    assert compactor.get_stats()['runs'] == 1
+
+
+def test_archive_is_written_outside_the_lock_and_keeps_new_entries(tmp_path, monkeypatch):
+    write_history(str(tmp_path), 50, 50)
+    lock = threading.Lock()
+    compactor = HistoryCompactor(str(tmp_path), lock, retention_days=29.5)
+    write_archive = compactor._write_archive
+
+    def append_while_archiving(entries):
+        # A request thread saving history while the archive is written
+        assert lock.acquire(blocking=False)
+        with open(tmp_path / "history.json") as f:
+            history = json.load(f)
+        history.append({'text': 'new', 'timestamp': str(datetime.utcnow())})
+        with open(tmp_path / "history.json", 'w') as f:
+            json.dump(history, f)
+        lock.release()
+        write_archive(entries)
+
+    monkeypatch.setattr(compactor, '_write_archive', append_while_archiving)
+    report = compactor.run_once()
+    with open(tmp_path / "history.json") as f:
+        remaining = json.load(f)
+    assert report['entries_compacted'] == 21
+    assert [entry['text'] for entry in remaining] == [str(i) for i in range(21, 50)] + ['new']
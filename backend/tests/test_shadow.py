@@ -0,0 +1,73 @@
+import json
+import os
+import time
+
+import pytest
+
+import shadow
+from model_registry import ModelRegistry
+from shadow import ShadowEvaluator, summarize
+
+
+@pytest.fixture
+def idle_cpu(monkeypatch):
+    monkeypatch.setattr(shadow, 'cpu_saturated', lambda: False)
+
+
+def rule(score, toxic_words):
+    return 'toxic' if score > 0.7 or toxic_words else 'neutral'
+
+
+def make_evaluator(tmp_path):
+    registry = ModelRegistry(lambda path: (lambda text: [{"label": "toxic", "score": 0.2}]))
+    registry.register('primary', 'P')
+    registry.register('candidate', 'C')
+    registry.activate('primary', background=False)
+    registry.pin('candidate')
+    registry.load('candidate')
+    log_path = tmp_path / "shadow.jsonl"
+    return ShadowEvaluator(registry, 'candidate', rule, fraction=1.0, log_path=str(log_path)), log_path
+
+
+def outcome(stage):
+    return {'model_id': 'primary', 'classification': 'toxic', 'confidence': 0.9,
+            'toxic_words': [], 'stage': stage}
+
+
+def test_shadow_records_bert_outcomes(tmp_path, idle_cpu):
+    evaluator, log_path = make_evaluator(tmp_path)
+    assert evaluator.submit("you are awful", outcome('bert'), 25.0)
+    for _ in range(50):
+        if evaluator.get_stats()['completed']:
+            break
+        time.sleep(0.01)
+    records = [json.loads(line) for line in log_path.read_text().splitlines()]
+    summary = summarize(records)
+    assert summary['records'] == 1
+    assert summary['by_classification']['toxic']['candidate_labels'] == {'neutral': 1}
+
+
+def test_shadow_skips_cascade_decided_outcomes(tmp_path, idle_cpu):
+    evaluator, log_path = make_evaluator(tmp_path)
+    assert not evaluator.submit("you idiot", outcome('lexicon'), 0.1)
+    assert not evaluator.submit("hello", outcome('linear'), 0.1)
+    assert evaluator.get_stats()['sampled'] == 0
+    assert not log_path.exists()
+
+
+def test_shadow_sheds_work_when_cpu_is_saturated(tmp_path, monkeypatch):
+    monkeypatch.setattr(shadow, 'cpu_saturated', lambda: True)
+    evaluator, log_path = make_evaluator(tmp_path)
+    assert not evaluator.submit("you are awful", outcome('bert'), 25.0)
+    stats = evaluator.get_stats()
+    assert (stats['sampled'], stats['shed_cpu'], stats['pending']) == (1, 1, 0)
+    assert not log_path.exists()
+
+
+def test_cpu_saturation_uses_available_cores(monkeypatch):
+    monkeypatch.setattr(os, 'getloadavg', lambda: (3.0, 0.0, 0.0), raising=False)
+    monkeypatch.setattr(os, 'cpu_count', lambda: 64)
+    monkeypatch.setattr(shadow, 'available_cores', lambda: [0, 1])
+    assert shadow.cpu_saturated(max_load=0.8)
+    monkeypatch.setattr(shadow, 'available_cores', lambda: list(range(8)))
+    assert not shadow.cpu_saturated(max_load=0.8)